@@ -1,22 +1,21 @@
 import sys
-import yaml
 
 from argparse import ArgumentParser
 from loguru import logger
 from datetime import datetime
 
-from aes_agent.environment import (
-    OfflineSearchEnvironment,
-    OnlineSearchEnvironment,
-    Environment,
-)
-from aes_agent.llm import LLM, AnthropicLLM, OpenAILLM
-from aes_agent.agent import Agent
+from aes_agent.cassette import Cassette
+from aes_agent.config import load_from_cgf
 
 parser = ArgumentParser()
 parser.add_argument("--config", type=str, required=True)
 parser.add_argument("--task", type=str, required=True)
+parser.add_argument("--record", type=str, default=None, help="Save the run's LLM and tool interactions to this cassette")
+parser.add_argument("--replay", type=str, default=None, help="Replay a recorded cassette instead of calling the LLM and tools")
+parser.add_argument("--realtime", action="store_true", help="Reproduce the recorded timings when replaying")
 args = parser.parse_args()
+if args.record and args.replay:
+    parser.error("--record and --replay are mutually exclusive")
 
 log_filename = "logs/my_app_log_{time:YYYY-MM-DD-hh-mm-ss}.log"
 logger.add(
@@ -26,31 +25,13 @@ logger.add(
 )
 
 
-def load_from_cgf(path: str) -> tuple[Environment, Agent]:
-    with open(path, "r") as file:
-        config = yaml.safe_load(file)
-
-    model_name = config["agent"]["llm"]["model"]
-    match config["agent"]["llm"]["type"]:
-        case "openai":
-            llm = OpenAILLM(model=model_name)
-        case "anthropic":
-            llm = AnthropicLLM(model=model_name)
-        case _:
-            raise Exception(f"{config['agent']['llm']['type']} is not a supported LLM.")
-
-    match config["environment"]["type"]:
-        case "OfflineSearchEnvironment":
-            env = OfflineSearchEnvironment(**config["environment"]["args"])
-        case "OnlineSearchEnvironment":
-            env = OnlineSearchEnvironment(**config["environment"]["args"])
-        case _:
-            raise Exception(
-                f"{config['environment']['type']} is not a supported environment."
-            )
-    agent = Agent(llm=llm, mode=config["agent"]["output_mode"])
-    return env, agent
-
+cassette = None
+if args.record:
+    cassette = Cassette(args.record, mode="record")
+elif args.replay:
+    cassette = Cassette(args.replay, mode="replay", realtime=args.realtime)
 
-env, agent = load_from_cgf(args.config)
+env, agent = load_from_cgf(args.config, cassette)
 agent.run(env, args.task)
+if agent.llm.response_cache is not None:
+    logger.info(f"LLM response cache: {agent.llm.response_cache.stats}")
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+
+from argparse import ArgumentParser
+from loguru import logger
+
+from aes_agent.config import load_agent, load_config, load_environment, load_llm
+from aes_agent.llm import aclose_shared_http_client
+from aes_agent.mcp.pool import MCPServerPool
+from aes_agent.metrics import MetricsRegistry
+from aes_agent.tracing import Tracer, use_tracer
+from aes_agent.utils import to_jsonable
+
+parser = ArgumentParser()
+parser.add_argument("--config", type=str, required=True)
+parser.add_argument("--tasks", type=str, required=True, help="JSONL file, one {\"task\": ...} per line (optional \"id\")")
+parser.add_argument("--output", type=str, required=True, help="JSONL file the results are appended to")
+parser.add_argument("--concurrency", type=int, default=8)
+args = parser.parse_args()
+
+log_filename = "logs/batch_log_{time:YYYY-MM-DD-hh-mm-ss}.log"
+logger.add(
+    log_filename,
+    level="INFO",
+    format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}",
+)
+
+
+async def run_batch(config: dict, tasks: list[dict], output_path: str, concurrency: int):
+    # The LLM is stateless and shares its connection pool, every task gets its own agent and environment
+    llm = load_llm(config)
+    # Aggregated over the whole batch (exported when it ends if the config sets metrics_dir / trace_path)
+    metrics = MetricsRegistry()
+    tracer = Tracer(config["agent"]["trace_path"]) if "trace_path" in config["agent"] else None
+    # MCP servers are started once and reused by the tasks
+    server_pool = MCPServerPool(max_size=concurrency)
+    environment = load_environment(config)
+    # Servers mounted in-process don't use the pool
+    if not environment.in_process:
+        with use_tracer(tracer):
+            await server_pool.prewarm(
+                environment._mcp_server_script, environment._mcp_server_args, concurrency
+            )
+    semaphore = asyncio.Semaphore(concurrency)
+    finished = 0
+    start = time.perf_counter()
+
+    with open(output_path, "a") as output_file:
+
+        async def run_task(i: int, task: dict):
+            nonlocal finished
+            async with semaphore:
+                environment = load_environment(config)
+                agent = load_agent(config, llm, server_pool, metrics, tracer, save_after_run=False)
+                task_start = time.perf_counter()
+                record = {"id": task.get("id", i), "task": task["task"]}
+                try:
+                    await agent._run(environment, task["task"])
+                    record["final_answer"] = agent.final_answer
+                except Exception as e:
+                    logger.exception(f"Task {record['id']} failed")
+                    record["error"] = repr(e)
+                record["turns"] = len(agent.history)
+                record["duration"] = time.perf_counter() - task_start
+                record["history"] = agent.history
+
+            output_file.write(json.dumps(record, default=to_jsonable) + "\n")
+            output_file.flush()
+            finished += 1
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"{finished}/{len(tasks)} tasks done ({finished / elapsed:.2f} tasks/s)"
+            )
+
+        await asyncio.gather(*[run_task(i, task) for i, task in enumerate(tasks)])
+
+    await server_pool.close()
+    await aclose_shared_http_client()
+
+    elapsed = time.perf_counter() - start
+    logger.success(
+        f"Ran {len(tasks)} tasks in {elapsed:.1f}s ({len(tasks) / elapsed:.2f} tasks/s, concurrency {concurrency})"
+    )
+    if "metrics_dir" in config["agent"]:
+        paths = metrics.export(config["agent"]["metrics_dir"])
+        logger.info(f"Exported metrics to {', '.join(paths)}")
+    if tracer is not None:
+        tracer.save()
+    if llm.response_cache is not None:
+        logger.info(f"LLM response cache: {llm.response_cache.stats}")
+        llm.response_cache.close()
+
+
+with open(args.tasks, "r") as tasks_file:
+    tasks = [json.loads(line) for line in tasks_file if line.strip()]
+
+asyncio.run(run_batch(load_config(args.config), tasks, args.output, args.concurrency))
@@ -0,0 +1,46 @@
+"""
+Local stand-in for the Brave web search endpoint, used to benchmark the search client offline.
+
+    python benchmarks/brave_stub.py --port 8765 --latency 0.05
+    BRAVE_SEARCH_URL=http://127.0.0.1:8765/res/v1/web/search ...
+"""
+
+import asyncio
+
+from argparse import ArgumentParser
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+def create_app(latency: float = 0.0, results: int = 10) -> Starlette:
+    async def web_search(request: Request) -> JSONResponse:
+        if latency:
+            await asyncio.sleep(latency)
+        question = request.query_params.get("q", "")
+        return JSONResponse(
+            {
+                "web": {
+                    "results": [
+                        {
+                            "title": f"Result {i} for {question}",
+                            "url": f"https://example.com/{i}",
+                        }
+                        for i in range(results)
+                    ]
+                }
+            }
+        )
+
+    return Starlette(routes=[Route("/res/v1/web/search", web_search)])
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency), host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,198 @@
+"""
+Load test: sweeps the number of concurrent agent runs against a simulated LLM
+and the latency-injecting MCP server (aes_agent/mcp/servers/latency.py).
+
+    python benchmarks/load_test.py --concurrency 1 10 50 100 200 --mode native
+    python benchmarks/load_test.py --concurrency 50 --transport pool --llm-latency 2 --tool-latency 0.5
+
+No provider is called. For each concurrency level, `concurrency * waves` runs
+are started (at most `concurrency` at a time) and the harness reports throughput,
+p50/p99 turn latency, the memory added per concurrent agent (peak RSS over the
+level, minus the RSS before it) and the lag of the event loop.
+"""
+
+import asyncio
+import gc
+import json
+import os
+import resource
+import statistics
+import time
+
+from argparse import ArgumentParser
+from typing import Optional
+
+from loguru import logger
+
+from aes_agent.agent import Agent
+from aes_agent.environment import LatencyEnvironment
+from aes_agent.mcp.pool import MCPServerPool
+from aes_agent.metrics import MetricsRegistry
+from aes_agent.simulation import (
+    LatencyDistribution,
+    SimulatedAnthropicLLM,
+    SimulatedOpenAILLM,
+    default_script,
+)
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc isn't available)"""
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class LoopMonitor:
+    """Samples the event loop's lag (how late a sleep wakes up) and the process' RSS"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: list[float] = []
+        self.peak_rss = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _monitor(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+
+    def start(self):
+        self._task = asyncio.create_task(self._monitor())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+async def run_level(args, concurrency: int) -> dict:
+    script = default_script(args.turns, args.calls_per_turn)
+    llm_class = SimulatedAnthropicLLM if args.backend == "anthropic" else SimulatedOpenAILLM
+    llm = llm_class(
+        script=script,
+        mode=args.mode,
+        latency=LatencyDistribution(args.llm_latency, args.llm_sigma),
+        time_to_first_token=LatencyDistribution(args.ttft, args.llm_sigma),
+        streaming=not args.no_streaming,
+    )
+    environment_kwargs = {
+        "max_turns": args.turns,
+        "tool_latency_median": args.tool_latency,
+        "tool_latency_sigma": args.tool_sigma,
+        "payload_size": args.payload_size,
+        "in_process": args.transport == "in-process",
+    }
+    server_pool = None
+    if args.transport == "pool":
+        server_pool = MCPServerPool(max_size=concurrency)
+        environment = LatencyEnvironment(**environment_kwargs)
+        await server_pool.prewarm(
+            environment._mcp_server_script, environment._mcp_server_args, concurrency
+        )
+
+    metrics = MetricsRegistry()
+    semaphore = asyncio.Semaphore(concurrency)
+    runs = concurrency * args.waves
+    failures = 0
+
+    async def one_run():
+        nonlocal failures
+        async with semaphore:
+            agent = Agent(llm, mode=args.mode, server_pool=server_pool, metrics=metrics)
+            try:
+                await agent._run(LatencyEnvironment(**environment_kwargs), "Simulated task")
+                if agent.final_answer is None:
+                    failures += 1
+            except Exception as e:
+                logger.error(f"Run failed: {e!r}")
+                failures += 1
+
+    gc.collect()
+    rss_before = rss_bytes()
+    monitor = LoopMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*[one_run() for _ in range(runs)])
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    if server_pool is not None:
+        await server_pool.close()
+
+    turn_durations = [
+        duration
+        for values in metrics.histogram("turn_duration_seconds").series.values()
+        for duration in values
+    ]
+    return {
+        "concurrency": concurrency,
+        "runs": runs,
+        "failures": failures,
+        "elapsed_seconds": elapsed,
+        "runs_per_second": runs / elapsed,
+        "turns_per_second": len(turn_durations) / elapsed,
+        "turn_latency_p50_seconds": percentile(turn_durations, 0.5),
+        "turn_latency_p99_seconds": percentile(turn_durations, 0.99),
+        "memory_per_agent_bytes": max(0, monitor.peak_rss - rss_before) / concurrency,
+        "loop_lag_mean_seconds": statistics.mean(monitor.lags) if monitor.lags else 0.0,
+        "loop_lag_p99_seconds": percentile(monitor.lags, 0.99),
+        "loop_lag_max_seconds": max(monitor.lags, default=0.0),
+    }
+
+
+async def main(args):
+    # Imports, server module setup and SDK model building happen before the first measurement
+    await run_level(args, 1)
+    results = []
+    print(
+        f"{'concurrency':>11} {'runs':>5} {'fail':>4} {'runs/s':>8} {'turns/s':>8} "
+        f"{'turn p50':>9} {'turn p99':>9} {'KiB/agent':>10} {'lag p99':>8} {'lag max':>8}"
+    )
+    for concurrency in args.concurrency:
+        result = await run_level(args, concurrency)
+        results.append(result)
+        print(
+            f"{result['concurrency']:>11} {result['runs']:>5} {result['failures']:>4} "
+            f"{result['runs_per_second']:>8.2f} {result['turns_per_second']:>8.2f} "
+            f"{result['turn_latency_p50_seconds']:>8.3f}s {result['turn_latency_p99_seconds']:>8.3f}s "
+            f"{result['memory_per_agent_bytes'] / 1024:>10.0f} "
+            f"{result['loop_lag_p99_seconds'] * 1000:>6.1f}ms {result['loop_lag_max_seconds'] * 1000:>6.1f}ms"
+        )
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump({"parameters": vars(args), "results": results}, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--waves", type=int, default=2, help="Runs per level = concurrency * waves")
+    parser.add_argument("--mode", choices=["native", "custom-parser"], default="native")
+    parser.add_argument("--backend", choices=["anthropic", "openai"], default="anthropic")
+    parser.add_argument("--transport", choices=["in-process", "stdio", "pool"], default="in-process")
+    parser.add_argument("--no-streaming", action="store_true")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--calls-per-turn", type=int, default=2)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Median (seconds)")
+    parser.add_argument("--llm-sigma", type=float, default=0.3, help="Log-normal sigma")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Median time to first token (seconds)")
+    parser.add_argument("--tool-latency", type=float, default=0.2, help="Median (seconds)")
+    parser.add_argument("--tool-sigma", type=float, default=0.5, help="Log-normal sigma")
+    parser.add_argument("--payload-size", type=int, default=4000, help="Characters per tool result")
+    parser.add_argument("--output", type=str, default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    logger.remove()
+    asyncio.run(main(args))
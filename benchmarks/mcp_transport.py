@@ -0,0 +1,81 @@
+"""
+Per-call overhead of the stdio and in-process MCP transports, side by side.
+
+    python benchmarks/mcp_transport.py --calls 200 --pdf example_resources/2408.03314v1.pdf
+
+Each transport is timed on a tiny tool call (`add` on the default server) and,
+when a PDF is given, on a large result (a whole page through `read_specific_page`).
+"""
+
+import asyncio
+import importlib.resources
+import statistics
+import time
+
+from argparse import ArgumentParser
+from typing import Optional
+
+from loguru import logger
+from aes_agent.mcp.client import MCPClient
+
+
+def server_script(name: str) -> str:
+    return str(importlib.resources.files("aes_agent").joinpath(f"mcp/servers/{name}.py"))
+
+
+async def time_calls(client: MCPClient, tool: str, arguments: dict, calls: int) -> list[float]:
+    await client.session.call_tool(tool, arguments)  # warm-up
+    durations = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await client.session.call_tool(tool, arguments)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+async def benchmark(
+    transport: str, server: str, server_args: list[str], tool: str, arguments: dict, calls: int
+):
+    client = MCPClient()
+    start = time.perf_counter()
+    if transport == "stdio":
+        await client.connect_to_server(server_script(server), server_args)
+    else:
+        await client.connect_in_process(f"aes_agent.mcp.servers.{server}", server_args)
+    startup = time.perf_counter() - start
+    try:
+        durations = await time_calls(client, tool, arguments, calls)
+    finally:
+        await client.cleanup()
+    durations.sort()
+    print(
+        f"{transport:<11} {tool:<19} startup {startup * 1000:8.1f}ms | "
+        f"per call mean {statistics.mean(durations) * 1000:7.3f}ms, "
+        f"p50 {durations[len(durations) // 2] * 1000:7.3f}ms, "
+        f"p99 {durations[int(len(durations) * 0.99) - 1] * 1000:7.3f}ms"
+    )
+
+
+async def main(calls: int, pdf: Optional[str], page: int):
+    for transport in ["stdio", "in-process"]:
+        await benchmark(transport, "default", [], "add", {"a": 1, "b": 2}, calls)
+    if pdf is not None:
+        for transport in ["stdio", "in-process"]:
+            await benchmark(
+                transport,
+                "local_search",
+                ["--available-files", pdf],
+                "read_specific_page",
+                {"pdf_path": pdf, "pdf_page": page},
+                calls,
+            )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--pdf", type=str, default=None)
+    parser.add_argument("--page", type=int, default=0)
+    args = parser.parse_args()
+    logger.remove()
+    asyncio.run(main(args.calls, args.pdf, args.page))
@@ -0,0 +1,63 @@
+"""
+Throughput of BraveSearchClient against the local stub endpoint.
+
+    python benchmarks/search_client.py --requests 500 --concurrency 50 --latency 0.05
+
+By default the stub runs on the same event loop as the client. To keep them from
+sharing a core, start `brave_stub.py` separately and pass its address with --url.
+"""
+
+import asyncio
+import time
+
+from argparse import ArgumentParser
+
+import uvicorn
+
+from loguru import logger
+from brave_stub import create_app
+from aes_agent.search_client import BraveSearchClient
+
+
+async def main(requests: int, concurrency: int, latency: float, port: int, url: str | None):
+    server = None
+    if url is None:
+        server = uvicorn.Server(
+            uvicorn.Config(create_app(latency), host="127.0.0.1", port=port, log_level="warning")
+        )
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        url = f"http://127.0.0.1:{port}/res/v1/web/search"
+
+    client = BraveSearchClient("stub", base_url=url, max_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_search(i: int):
+        async with semaphore:
+            await client.search(f"question {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one_search(i) for i in range(requests)])
+    elapsed = time.perf_counter() - start
+    print(
+        f"{requests} searches, concurrency {concurrency}: "
+        f"{elapsed:.2f}s ({requests / elapsed:.1f} searches/s)"
+    )
+
+    await client.aclose()
+    if server is not None:
+        server.should_exit = True
+        await server_task
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", type=str, default=None)
+    args = parser.parse_args()
+    logger.remove()
+    asyncio.run(main(args.requests, args.concurrency, args.latency, args.port, args.url))
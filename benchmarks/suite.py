@@ -0,0 +1,337 @@
+"""
+Offline micro-benchmarks of the agent's hot paths, compared against a stored baseline.
+
+    python benchmarks/suite.py                    # run and compare with benchmarks/baseline.json
+    python benchmarks/suite.py --save-baseline    # run and store the results as the new baseline
+    python benchmarks/suite.py --only mcp --threshold 0.3
+
+Nothing leaves the machine: PDFs come from example_resources/, MCP servers are
+the bundled ones and the LLM is a stub returning canned responses instantly.
+Each benchmark reports its time per operation: the fastest of a few repeats,
+or their median for the ones doing I/O. A result slower than its baseline by
+more than --threshold is flagged as a regression and makes the script exit
+with status 1. Baselines are specific to the machine they were recorded on.
+"""
+
+import asyncio
+import gc
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+# Extracted pages and indexes go to a scratch directory, not to the user's cache
+os.environ["AES_AGENT_CACHE_DIR"] = tempfile.mkdtemp(prefix="aes_agent_benchmarks_")
+
+from anthropic.types import Message
+
+from aes_agent.agent import Agent
+from aes_agent.conversation import Conversation
+from aes_agent.documents import DocumentPool, extract_pages
+from aes_agent.environment import Environment
+from aes_agent.llm import AnthropicLLM
+from aes_agent.logic.custom_parser import render_turn, tools_to_docllm_format
+from aes_agent.logic.native import render_anthropic_turn
+from aes_agent.mcp.client import MCPClient
+from aes_agent.mcp.servers import local_search
+from aes_agent.utils import Turn, parse_function_call
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+PDFS = sorted(glob.glob(os.path.join(ROOT, "example_resources", "*.pdf")))
+REPEAT = 5
+
+# name -> function returning the time of one operation, in seconds
+BENCHMARKS: dict[str, Callable[[], float]] = {}
+
+
+def benchmark(name: str):
+    def register(function: Callable[[], float]) -> Callable[[], float]:
+        BENCHMARKS[name] = function
+        return function
+
+    return register
+
+
+def time_per_call(function: Callable[[], object], number: int) -> float:
+    """Like timeit: the garbage collector is off while timing, and the fastest repeat is kept"""
+    timings = []
+    gc.disable()
+    try:
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            timings.append((time.perf_counter() - start) / number)
+    finally:
+        gc.enable()
+    return min(timings)
+
+
+async def async_time_per_call(function: Callable[[], Awaitable[object]], number: int) -> float:
+    await function()  # warm-up
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for _ in range(number):
+            await function()
+        timings.append((time.perf_counter() - start) / number)
+    return statistics.median(timings)
+
+
+def fake_turn(i: int, result_size: int = 2000) -> Turn:
+    return {
+        "reasoning": f"Reasoning of turn {i}",
+        "tools_called": [
+            {
+                "name": "read_specific_page",
+                "arguments": {"pdf_path": "example.pdf", "pdf_page": i},
+                "result": "word " * (result_size // 5),
+                "id": f"toolu_{i}",
+                "metadata": {
+                    "is_error": False,
+                    "assistant_full_content": [
+                        {"type": "text", "text": f"Reading page {i}"},
+                        {
+                            "type": "tool_use",
+                            "id": f"toolu_{i}",
+                            "name": "read_specific_page",
+                            "input": {"pdf_path": "example.pdf", "pdf_page": i},
+                        },
+                    ],
+                },
+            }
+        ],
+    }
+
+
+async def default_server_tools() -> list[dict]:
+    client = MCPClient()
+    await client.connect_in_process("aes_agent.mcp.servers.default")
+    try:
+        return (await client.tool_catalog()).tools
+    finally:
+        await client.cleanup()
+
+
+# PARSING AND FORMATTING
+
+
+@benchmark("parse_function_call")
+def bench_parse_function_call() -> float:
+    action = "read_specific_page(pdf_path='example_resources/2408.03314v1.pdf', pdf_page=3)"
+    return time_per_call(lambda: parse_function_call(action), 2000)
+
+
+@benchmark("tools_to_docllm_format")
+def bench_tools_to_docllm_format() -> float:
+    tools = asyncio.run(default_server_tools())
+    return time_per_call(lambda: tools_to_docllm_format(tools), 2000)
+
+
+# MESSAGE CONSTRUCTION AS THE HISTORY GROWS
+
+
+def bench_messages(format_name: str, render, turns: int) -> float:
+    """Renders a conversation from scratch, as a turn used to be built before incremental rendering"""
+
+    def build():
+        conversation = Conversation()
+        for i in range(turns):
+            conversation.append(fake_turn(i))
+        return conversation.messages(format_name, render)
+
+    return time_per_call(build, max(1, 2000 // turns))
+
+
+def bench_incremental_messages(format_name: str, render, turns: int) -> float:
+    """Renders one more turn of a conversation of `turns` turns"""
+    conversation = Conversation()
+    for i in range(turns):
+        conversation.append(fake_turn(i))
+    conversation.messages(format_name, render)
+    new_turns = iter([fake_turn(turns + i) for i in range(REPEAT * 1000)])
+
+    def next_turn():
+        conversation.append(next(new_turns))
+        conversation.messages(format_name, render)
+
+    return time_per_call(next_turn, 1000)
+
+
+def bench_anthropic_request(turns: int) -> float:
+    """Builds the Anthropic request (with its cache breakpoints) of a turn"""
+    llm = AnthropicLLM("stub")
+    conversation = Conversation()
+    for i in range(turns):
+        conversation.append(fake_turn(i))
+    messages = [
+        {"role": "system", "content": "system prompt"},
+        {"role": "user", "content": "task"},
+        *conversation.messages("anthropic", render_anthropic_turn),
+    ]
+    return time_per_call(lambda: llm._request(messages, [], "state"), 500)
+
+
+for turns in [10, 50, 200]:
+    benchmark(f"messages_text_full[{turns}]")(
+        lambda turns=turns: bench_messages("text", render_turn, turns)
+    )
+    benchmark(f"messages_text_incremental[{turns}]")(
+        lambda turns=turns: bench_incremental_messages("text", render_turn, turns)
+    )
+    benchmark(f"messages_anthropic_incremental[{turns}]")(
+        lambda turns=turns: bench_incremental_messages("anthropic", render_anthropic_turn, turns)
+    )
+    benchmark(f"anthropic_request[{turns}]")(lambda turns=turns: bench_anthropic_request(turns))
+
+
+# PDF EXTRACTION
+
+
+@benchmark("pdf_extract_pages")
+def bench_extract_pages() -> float:
+    return time_per_call(lambda: [extract_pages(pdf) for pdf in PDFS], 2)
+
+
+@benchmark("pdf_read_pdf")
+def bench_read_pdf() -> float:
+    return time_per_call(lambda: [local_search.read_pdf(pdf) for pdf in PDFS], 50)
+
+
+@benchmark("pdf_read_pdf_page")
+def bench_read_pdf_page() -> float:
+    return time_per_call(lambda: [local_search.read_pdf_page(pdf, 3) for pdf in PDFS], 500)
+
+
+@benchmark("pdf_document_pool_page_text")
+def bench_document_pool_page_text() -> float:
+    document_pool = DocumentPool()
+    return time_per_call(lambda: [document_pool.page_text(pdf, 3) for pdf in PDFS], 200)
+
+
+# MCP
+
+
+@benchmark("mcp_stdio_round_trip")
+def bench_mcp_stdio_round_trip() -> float:
+    async def run() -> float:
+        client = MCPClient()
+        await client.connect_to_server(
+            os.path.join(ROOT, "src", "aes_agent", "mcp", "servers", "default.py")
+        )
+        try:
+            return await async_time_per_call(
+                lambda: client.session.call_tool("add", {"a": 1, "b": 2}), 100
+            )
+        finally:
+            await client.cleanup()
+
+    return asyncio.run(run())
+
+
+# END TO END
+
+
+class StubLLM(AnthropicLLM):
+    """Calls `add` on every turn but the last one, which gives the final answer"""
+
+    def __init__(self, turns: int):
+        super().__init__("stub", streaming=False)
+        self.turns = turns
+
+    async def query(self, messages: list[dict], available_tools: list = [], context: str = ""):
+        self._request(messages, available_tools, context)
+        turn = sum(1 for message in messages if message["role"] == "assistant")
+        if turn + 1 < self.turns:
+            tool_use = {"name": "add", "input": {"a": turn, "b": 1}}
+        else:
+            tool_use = {"name": "final_answer", "input": {"answer": "done"}}
+        return Message.model_validate(
+            {
+                "id": "msg_stub",
+                "type": "message",
+                "role": "assistant",
+                "model": "stub",
+                "content": [
+                    {"type": "text", "text": "Reasoning"},
+                    {"type": "tool_use", "id": f"toolu_{turn}", **tool_use},
+                ],
+                "stop_reason": "tool_use",
+                "usage": {"input_tokens": 100, "output_tokens": 10},
+            }
+        )
+
+
+@benchmark("agent_turn_overhead")
+def bench_agent_turn_overhead() -> float:
+    turns = 10
+
+    async def run():
+        environment = Environment(in_process=True)
+        environment.max_turns = turns
+        await Agent(StubLLM(turns), mode="native")._run(environment, "Add numbers")
+
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        asyncio.run(run())
+        timings.append((time.perf_counter() - start) / turns)
+    return statistics.median(timings)
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    regressions = []
+    print(f"{'benchmark':<40} {'time/op':>12} {'baseline':>12} {'change':>9}")
+    for name, seconds in results.items():
+        line = f"{name:<40} {seconds * 1e6:>10.1f}us"
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            flag = "  REGRESSION" if change > threshold else ""
+            line += f" {baseline[name] * 1e6:>10.1f}us {change:>+8.1%}{flag}"
+            if flag:
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--only", type=str, default=None, help="Only run benchmarks containing this string")
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Tolerated slowdown (0.25 = 25%%)")
+    parser.add_argument("--output", type=str, default=None, help="Also write the results to this JSON file")
+    parser.add_argument("--rounds", type=int, default=3, help="Runs of each benchmark, the best one is kept")
+    args = parser.parse_args()
+    logger.remove()
+
+    results: dict[str, float] = {}
+    for name, function in BENCHMARKS.items():
+        if args.only is None or args.only in name:
+            results[name] = min(function() for _ in range(args.rounds))
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
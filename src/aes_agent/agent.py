@@ -1,8 +1,19 @@
 import asyncio
+import time
 
-from aes_agent.llm import LLM
+from contextlib import nullcontext
+from typing import Optional
+
+from aes_agent.llm import LLM, aclose_shared_http_client
 from aes_agent.environment import Environment
 from aes_agent.mcp.client import MCPClient
+from aes_agent.mcp.pool import MCPServerPool
+from aes_agent.conversation import Conversation
+from aes_agent.compaction import HistoryCompactor
+from aes_agent.metrics import MetricsRegistry
+from aes_agent.tracing import Tracer, span, use_tracer
+from aes_agent.cassette import Cassette
+from aes_agent.memoization import ToolMemo
 from aes_agent.logic.custom_parser import custom_parser
 from aes_agent.logic.native import native
 from aes_agent.utils import ToolCallingResults, Turn
@@ -26,11 +37,45 @@ TOOL_FORMATING_MAPPING = {"custom-parser": tool_to_docllm_format}
 
 
 class Agent:
-    def __init__(self, llm: LLM, mode="doc_llm"):
+    def __init__(
+        self,
+        llm: LLM,
+        mode="doc_llm",
+        max_concurrent_tool_calls: int = 4,
+        server_pool: Optional[MCPServerPool] = None,
+        history_token_budget: Optional[int] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        metrics_dir: Optional[str] = None,
+        tracer: Optional[Tracer] = None,
+        cassette: Optional[Cassette] = None,
+        memoize_tools: bool = True,
+        save_after_run: bool = True,
+    ):
         self.llm = llm
-        self._mcp_client = MCPClient()
+        self._mcp_client = MCPClient(server_pool)
         self.mode = mode
-        self.history: list[Turn] = []
+        self.max_concurrent_tool_calls = max_concurrent_tool_calls
+        self.conversation = Conversation()
+        self.history: list[Turn] = self.conversation.turns
+        # Old tool results are compacted once the history exceeds the budget (if any)
+        self.compactor = (
+            HistoryCompactor(history_token_budget) if history_token_budget is not None else None
+        )
+        # Can be shared with other agents, exported to `metrics_dir` (if any) after each run
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.metrics_dir = metrics_dir
+        # Spans of the runs are saved to the tracer's file after each run (no tracing if None)
+        self.tracer = tracer
+        # False when the metrics and spans are shared and saved by the caller instead (e.g. once
+        # at the end of a batch, rather than rewriting the files after each run)
+        self.save_after_run = save_after_run
+        # LLM responses and tool results are recorded to / replayed from the cassette (if any)
+        self.cassette = cassette
+        if cassette is not None:
+            cassette.wrap_llm(self.llm)
+        # Results of the tools the server annotates as deterministic are reused within a run
+        self.memoize_tools = memoize_tools
+        self.tool_memo: Optional[ToolMemo] = None
 
     @property
     def _tool_formating_function(self):
@@ -39,56 +84,121 @@ class Agent:
         return TOOL_FORMATING_MAPPING[self.mode]
 
     async def _run(self, environment: Environment, task: str):
-        logger.info(
-            f"Setting up environment's MCP server: {environment._mcp_server_script}"
-        )
-        await self._mcp_client.connect_to_server(environment._mcp_server_script)
+        with use_tracer(self.tracer) if self.tracer is not None else nullcontext():
+            try:
+                with span("agent.run", task=task, mode=self.mode, environment=str(environment)):
+                    return await self._run_episode(environment, task)
+            finally:
+                if self.cassette is not None:
+                    self.cassette.save()
+                if self.tracer is not None and self.save_after_run:
+                    self.tracer.save()
+
+    async def _connect(self, environment: Environment):
+        if self.cassette is not None and self.cassette.mode == "replay":
+            logger.info(f"Replaying the environment's MCP server from {self.cassette.path}")
+            self._mcp_client.session = self.cassette.wrap_session()
+            return
+        if environment.in_process:
+            logger.info(
+                f"Mounting environment's MCP server in-process: {environment._mcp_server_module}"
+            )
+            with span("mcp.connect", server=environment._mcp_server_module, transport="in-process"):
+                await self._mcp_client.connect_in_process(
+                    environment._mcp_server_module, environment._mcp_server_args
+                )
+        else:
+            logger.info(
+                f"Setting up environment's MCP server: {environment._mcp_server_script}"
+            )
+            with span("mcp.connect", server=environment._mcp_server_script, transport="stdio"):
+                await self._mcp_client.connect_to_server(
+                    environment._mcp_server_script, environment._mcp_server_args
+                )
+        if self.cassette is not None:
+            self._mcp_client.session = self.cassette.wrap_session(self._mcp_client.session)
+
+    async def _run_episode(self, environment: Environment, task: str):
+        await self._connect(environment)
+        if self.memoize_tools:
+            self.tool_memo = ToolMemo(
+                " ".join([environment._mcp_server_module, *environment._mcp_server_args])
+            )
         logger.info(f"Running agent in environment {environment}")
-        while environment.is_running:
-            environment.turn += 1
-            logger.info(f"Entering turn {environment.turn}")
-            response = await self._mcp_client.session.list_tools()
-            available_tools = [
-                {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "input_schema": tool.inputSchema,
-                }
-                for tool in response.tools
-            ]
-
-            match self.mode:
-                case "custom-parser":
-                    result = await custom_parser(
-                        self._mcp_client.session,
-                        environment,
-                        self.llm,
-                        available_tools,
-                        task,
-                        self.history,
-                    )
-                case "native":
-                    result = await native(
-                        self._mcp_client.session,
-                        environment,
-                        self.llm,
-                        available_tools,
-                        task,
-                        self.history,
-                    )
-                case _:
-                    raise Exception(f"{self.mode} is not a correct mode.")
-
-            self.history.append(result)
-            for tool_call in result["tools_called"]:
-                if tool_call["name"] == "final_answer":
-                    logger.success(f"Final answer: {tool_call['result']}")
-                    logger.info(f"Exiting {environment}")
-                    await self._mcp_client.cleanup()
-                    return self.history
+        try:
+            while environment.is_running:
+                environment.turn += 1
+                logger.info(f"Entering turn {environment.turn}")
+                with span("turn", turn=environment.turn):
+                    result = await self._turn(environment, task)
+                for tool_call in result["tools_called"]:
+                    if tool_call["name"] == "final_answer":
+                        logger.success(f"Final answer: {tool_call['result']}")
+                        return self.history
+            return self.history
+        finally:
+            logger.info(f"Exiting {environment}")
+            await self._mcp_client.cleanup()
+            if self.tool_memo is not None:
+                self.tool_memo.log_stats()
+            if self.metrics_dir is not None and self.save_after_run:
+                paths = self.metrics.export(self.metrics_dir)
+                logger.info(f"Exported metrics to {', '.join(paths)}")
 
-        logger.info(f"Exiting {environment}")
-        await self._mcp_client.cleanup()
+    async def _turn(self, environment: Environment, task: str) -> Turn:
+        turn_start = time.perf_counter()
+        if self.cassette is not None:
+            tool_catalog = await self.cassette.tool_catalog(self._mcp_client)
+        else:
+            tool_catalog = await self._mcp_client.tool_catalog()
+        compaction = self.compactor.compact(self.conversation) if self.compactor else None
+        session = self._mcp_client.session
+        if self.tool_memo is not None:
+            session = self.tool_memo.session(session, tool_catalog)
+
+        match self.mode:
+            case "custom-parser":
+                result = await custom_parser(
+                    session,
+                    environment,
+                    self.llm,
+                    tool_catalog,
+                    task,
+                    self.conversation,
+                )
+            case "native":
+                result = await native(
+                    session,
+                    environment,
+                    self.llm,
+                    tool_catalog,
+                    task,
+                    self.conversation,
+                    self.max_concurrent_tool_calls,
+                )
+            case _:
+                raise Exception(f"{self.mode} is not a correct mode.")
+
+        if compaction is not None:
+            result["compaction"] = compaction
+        self.conversation.append(result)
+        self.metrics.observe_turn(result, time.perf_counter() - turn_start)
+        return result
+
+    @property
+    def final_answer(self) -> Optional[str]:
+        for turn in reversed(self.history):
+            for tool_call in turn["tools_called"]:
+                if tool_call["name"] == "final_answer":
+                    return tool_call["result"]
+        return None
 
     def run(self, environment: Environment, task: str):
-        asyncio.run(self._run(environment, task))
+        async def run_and_close():
+            try:
+                return await self._run(environment, task)
+            finally:
+                # The event loop stops after the run, and its connection pool with it
+                await aclose_shared_http_client()
+
+        return asyncio.run(run_and_close())
@@ -0,0 +1,171 @@
+import asyncio
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from loguru import logger
+
+
+class _PooledPage:
+    def __init__(self, worker: "_BrowserWorker", context: Any, page: Any):
+        self.worker = worker
+        self.context = context
+        self.page = page
+        self.uses = 0
+
+
+class _BrowserWorker:
+    def __init__(self, browser: Any):
+        self.browser = browser
+        self.idle_pages: list[_PooledPage] = []
+        self.active_pages = 0
+        # Set while its replacement is being launched, so that it is only recycled once
+        self.recycling = False
+        # Set once replaced, its browser is closed when its last page in use is given back
+        self.draining = False
+
+
+class BrowserPool:
+    """
+    Long-lived Chromium processes handing out reusable pages.
+
+    At most `max_concurrency` pages are in use at once. Each page lives in its
+    own browser context and is thrown away after `max_page_uses` uses, or as soon
+    as something goes wrong with it. A browser that crashed or hangs is relaunched.
+    """
+
+    def __init__(
+        self,
+        browsers: int = 2,
+        max_concurrency: int = 4,
+        max_page_uses: int = 20,
+        close_timeout: float = 10,
+    ):
+        self.browsers = browsers
+        self.max_page_uses = max_page_uses
+        self.close_timeout = close_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._start_lock = asyncio.Lock()
+        self._playwright: Any = None
+        self._workers: list[_BrowserWorker] = []
+
+    async def _launch_worker(self) -> _BrowserWorker:
+        browser = await self._playwright.chromium.launch()
+        return _BrowserWorker(browser)
+
+    async def start(self):
+        async with self._start_lock:
+            if self._playwright is not None:
+                return
+            from playwright.async_api import async_playwright
+
+            self._playwright = await async_playwright().start()
+            self._workers = list(
+                await asyncio.gather(
+                    *[self._launch_worker() for _ in range(self.browsers)]
+                )
+            )
+            logger.info(f"Started a pool of {self.browsers} browsers")
+
+    async def _discard_page(self, pooled_page: _PooledPage):
+        try:
+            await asyncio.wait_for(pooled_page.context.close(), self.close_timeout)
+        except Exception as e:
+            # A context that can't be closed means the browser itself is in a bad state, it is
+            # hung if it didn't even answer (its other pages can't be served either)
+            logger.warning(f"Couldn't close browser context ({e!r}), recycling its browser")
+            await self._recycle_worker(
+                pooled_page.worker, broken=isinstance(e, asyncio.TimeoutError)
+            )
+
+    async def _close_browser(self, browser: Any):
+        try:
+            await asyncio.wait_for(browser.close(), self.close_timeout)
+        except Exception as e:
+            logger.warning(f"Couldn't close recycled browser: {e}")
+
+    async def _recycle_worker(self, worker: _BrowserWorker, broken: bool):
+        """
+        Replaces a worker with a new browser. The old browser is closed right away if it is
+        `broken` (disconnected or hung), otherwise once its pages in use are given back.
+        """
+        if worker.recycling or worker not in self._workers:
+            return
+        worker.recycling = True
+        try:
+            new_worker = await self._launch_worker()
+        except BaseException:
+            # The worker stays in the pool and is recycled on next checkout (if it was closed)
+            worker.recycling = False
+            if broken:
+                await self._close_browser(worker.browser)
+            raise
+        if worker not in self._workers:
+            # The pool was closed meanwhile, along with the old browser
+            await self._close_browser(new_worker.browser)
+            return
+        self._workers[self._workers.index(worker)] = new_worker
+        if broken:
+            await self._close_browser(worker.browser)
+        else:
+            worker.draining = True
+            await self._close_drained(worker)
+
+    async def _close_drained(self, worker: _BrowserWorker):
+        if worker.draining and worker.active_pages == 0:
+            worker.draining = False
+            await self._close_browser(worker.browser)
+
+    async def _checkout(self) -> _PooledPage:
+        for worker in list(self._workers):
+            if not worker.browser.is_connected():
+                logger.warning("Browser disconnected, relaunching it")
+                await self._recycle_worker(worker, broken=True)
+
+        for worker in self._workers:
+            if worker.idle_pages:
+                pooled_page = worker.idle_pages.pop()
+                worker.active_pages += 1
+                return pooled_page
+
+        worker = min(self._workers, key=lambda worker: worker.active_pages)
+        context = await worker.browser.new_context()
+        page = await context.new_page()
+        worker.active_pages += 1
+        return _PooledPage(worker, context, page)
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Any]:
+        """Lends a page. It goes back to the pool unless the caller raised an exception."""
+        await self.start()
+        async with self._semaphore:
+            pooled_page = await self._checkout()
+            healthy = False
+            try:
+                yield pooled_page.page
+                healthy = True
+            finally:
+                pooled_page.worker.active_pages -= 1
+                pooled_page.uses += 1
+                if (
+                    healthy
+                    and pooled_page.uses < self.max_page_uses
+                    and pooled_page.worker in self._workers
+                    and not pooled_page.page.is_closed()
+                ):
+                    pooled_page.worker.idle_pages.append(pooled_page)
+                else:
+                    await self._discard_page(pooled_page)
+                await self._close_drained(pooled_page.worker)
+
+    async def close(self):
+        if self._playwright is None:
+            return
+        for worker in self._workers:
+            try:
+                await asyncio.wait_for(worker.browser.close(), self.close_timeout)
+            except Exception as e:
+                logger.warning(f"Couldn't close browser: {e}")
+        self._workers = []
+        await self._playwright.stop()
+        self._playwright = None
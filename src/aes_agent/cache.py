@@ -0,0 +1,196 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Optional, TypedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Number of reads whose access times are buffered before being written to the database
+ACCESS_FLUSH_BATCH = 64
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def normalize_url(url: str) -> str:
+    """Lowercases scheme and host, drops default ports and fragments, sorts query parameters"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, netloc.rsplit(":", 1)[-1]) in [("http", "80"), ("https", "443")]:
+        netloc = netloc.rsplit(":", 1)[0]
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+class CacheEntry(TypedDict):
+    value: Any
+    metadata: dict
+    expires_at: float
+
+
+class PersistentCache:
+    """
+    Two-tier cache with per-entry TTLs.
+
+    Recently used entries are kept in an in-memory LRU bounded by a number of
+    entries, every entry is also written to a SQLite database (bounded as well,
+    least recently used rows are evicted first) so that it outlives the process.
+    Values and metadata must be JSON-serializable.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        default_ttl: float = 3600,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 10000,
+    ):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, CacheEntry] = OrderedDict()
+        # key -> access time not written to the database yet (eviction orders rows by it)
+        self._accessed: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT, metadata TEXT, expires_at REAL, accessed_at REAL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+        )
+        self._connection.commit()
+        # Upper bound of the number of rows (replaced keys are counted again), recounted on eviction
+        self._disk_entries = self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _remember(self, key: str, entry: CacheEntry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self._accessed[key] = time.time()
+            return entry
+        row = self._connection.execute(
+            "SELECT value, metadata, expires_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        entry = {
+            "value": json.loads(row[0]),
+            "metadata": json.loads(row[1]),
+            "expires_at": row[2],
+        }
+        self._accessed[key] = time.time()
+        self._remember(key, entry)
+        return entry
+
+    def _flush_accesses(self):
+        """Writes the buffered access times, the caller commits"""
+        self._connection.executemany(
+            "UPDATE entries SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+        )
+        self._accessed.clear()
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[CacheEntry]:
+        """
+        Returns the entry stored under `key`, or None. Expired entries are only
+        returned with `allow_stale`, e.g. to revalidate them.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if len(self._accessed) >= ACCESS_FLUSH_BATCH:
+                self._flush_accesses()
+                self._connection.commit()
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry["expires_at"] < time.time():
+                if not allow_stale:
+                    self.misses += 1
+                    return None
+                self.stale_hits += 1
+                return entry
+            self.hits += 1
+            return entry
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, metadata: dict = {}):
+        ttl = self.default_ttl if ttl is None else ttl
+        entry: CacheEntry = {
+            "value": value,
+            "metadata": dict(metadata),
+            "expires_at": time.time() + ttl,
+        }
+        with self._lock:
+            self._remember(key, entry)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    json.dumps(value),
+                    json.dumps(entry["metadata"]),
+                    entry["expires_at"],
+                    time.time(),
+                ),
+            )
+            self._accessed.pop(key, None)
+            self._flush_accesses()
+            self._disk_entries += 1
+            if self._disk_entries > self.max_disk_entries:
+                self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """
+        Deletes the least recently used rows down to 90% of `max_disk_entries`,
+        so that evictions happen in batches rather than on every write.
+        """
+        count = self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        target = self.max_disk_entries * 9 // 10
+        if count > target:
+            self._connection.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (count - target,),
+            )
+            count = target
+        self._disk_entries = count
+
+    def touch(self, key: str, ttl: Optional[float] = None):
+        """Extends the lifetime of an entry, e.g. after a successful revalidation."""
+        with self._lock:
+            entry = self._lookup(key)
+        if entry is not None:
+            self.set(key, entry["value"], ttl, entry["metadata"])
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_accesses()
+            self._connection.commit()
+            self._connection.close()
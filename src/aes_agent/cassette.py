@@ -0,0 +1,217 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+
+from collections import deque
+from typing import Any, Optional, TypedDict
+
+from loguru import logger
+from mcp import types
+
+from aes_agent.llm import FirstTokenCallback, OutputCallback, dump_response, load_response
+from aes_agent.mcp.client import MCPClient, ToolCatalog
+from aes_agent.utils import canonical_hash
+
+CASSETTE_VERSION = 1
+
+
+class CassetteEntry(TypedDict):
+    kind: str  # "llm", "tool" or "tools" (the catalog of a turn)
+    key: str
+    response: Any
+    # Recorded timings (seconds): whole call and, for streamed LLM responses, first token
+    duration: float
+    first_token: Optional[float]
+
+
+class CassetteSession:
+    """Stands for an MCP ClientSession: tool calls are recorded, or served from the cassette"""
+
+    def __init__(self, cassette: "Cassette", session: Any = None):
+        self.cassette = cassette
+        self.session = session
+
+    async def call_tool(self, name: str, arguments: Optional[dict] = None) -> types.CallToolResult:
+        key = canonical_hash({"tool": name, "arguments": arguments or {}})
+        if self.cassette.mode == "replay":
+            entry = await self.cassette.replay("tool", key)
+            return types.CallToolResult.model_validate(entry["response"])
+        start = time.perf_counter()
+        result = await self.session.call_tool(name, arguments)
+        self.cassette.record(
+            "tool", key, result.model_dump(mode="json"), time.perf_counter() - start
+        )
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        if self.session is None:
+            raise Exception(f"'{name}' isn't available when replaying a cassette")
+        return getattr(self.session, name)
+
+
+class Cassette:
+    """
+    Records the LLM responses, tool results and tool catalogs of runs, or replays them.
+
+    Each interaction is keyed by a canonical hash of its request. When replaying,
+    interactions are served back in the order they were recorded for a given key.
+    A request that was never recorded (e.g. its prompt contains the current date)
+    falls back to the next unused interaction of the same kind. No LLM provider or
+    MCP server is contacted. With `realtime`, the recorded timings are reproduced.
+    The cassette is a gzipped JSON lines file.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", realtime: bool = False):
+        if mode not in ["record", "replay"]:
+            raise Exception(f"Cassette mode should be 'record' or 'replay', not {mode}")
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self.entries: list[CassetteEntry] = []
+        # kind -> key -> recorded entries not served yet, and kind -> every entry not served yet
+        self._by_key: dict[str, dict[str, deque]] = {}
+        self._unserved: dict[str, list[CassetteEntry]] = {}
+        self._tool_catalogs: dict[str, ToolCatalog] = {}
+        if mode == "replay":
+            self._load()
+
+    def _load(self):
+        with gzip.open(self.path, "rt") as cassette_file:
+            header = json.loads(cassette_file.readline())
+            if header.get("version") != CASSETTE_VERSION:
+                raise Exception(f"Unsupported cassette version: {header.get('version')}")
+            for line in cassette_file:
+                entry: CassetteEntry = json.loads(line)
+                self.entries.append(entry)
+                self._by_key.setdefault(entry["kind"], {}).setdefault(
+                    entry["key"], deque()
+                ).append(entry)
+                self._unserved.setdefault(entry["kind"], []).append(entry)
+                if entry["kind"] == "tools" and entry["response"] is not None:
+                    self._tool_catalogs[entry["key"]] = ToolCatalog(
+                        entry["response"]["tools"], entry["response"]["annotations"]
+                    )
+
+    def save(self):
+        if self.mode != "record":
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with gzip.open(f"{self.path}.{os.getpid()}.tmp", "wt") as cassette_file:
+            cassette_file.write(json.dumps({"version": CASSETTE_VERSION}) + "\n")
+            for entry in self.entries:
+                cassette_file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        os.replace(f"{self.path}.{os.getpid()}.tmp", self.path)
+        logger.info(f"Saved {len(self.entries)} interactions to cassette {self.path}")
+
+    def record(
+        self, kind: str, key: str, response: Any, duration: float, first_token: Optional[float] = None
+    ):
+        self.entries.append(
+            {
+                "kind": kind,
+                "key": key,
+                "response": response,
+                "duration": duration,
+                "first_token": first_token,
+            }
+        )
+
+    def _next(self, kind: str, key: Optional[str]) -> CassetteEntry:
+        """Next entry recorded for `key`, or in recording order if there is none (or no key)"""
+        recorded = self._by_key.get(kind, {}).get(key) if key is not None else None
+        if recorded:
+            entry = recorded.popleft()
+        elif self._unserved.get(kind):
+            entry = self._unserved[kind][0]
+            if key is not None:
+                logger.warning(f"No recorded {kind} interaction matches the request, replaying the next one")
+            self._by_key[kind][entry["key"]].remove(entry)
+        else:
+            raise Exception(f"No recorded {kind} interaction left in cassette {self.path}")
+        self._unserved[kind].remove(entry)
+        return entry
+
+    async def replay(self, kind: str, key: str) -> CassetteEntry:
+        entry = self._next(kind, key)
+        if self.realtime:
+            await asyncio.sleep(entry["duration"])
+        return entry
+
+    def wrap_llm(self, llm):
+        """Routes the queries and streams of an LLM backend through the cassette (in place)"""
+        query, stream = llm.query, llm.stream
+
+        def request_key(messages: list[dict], available_tools: list) -> str:
+            # The context (the environment's state) is left out: it changes between runs, e.g.
+            # with the current date, and would make a replay miss every request
+            return canonical_hash(
+                {"model": llm.model, "messages": messages, "tools": available_tools}
+            )
+
+        async def cassette_query(messages: list[dict], available_tools: list = [], context: str = ""):
+            key = request_key(messages, available_tools)
+            if self.mode == "replay":
+                return load_response((await self.replay("llm", key))["response"])
+            start = time.perf_counter()
+            response = await query(messages, available_tools=available_tools, context=context)
+            self.record("llm", key, dump_response(response), time.perf_counter() - start)
+            return response
+
+        async def cassette_stream(
+            messages: list[dict],
+            available_tools: list,
+            on_output: OutputCallback,
+            context: str = "",
+            on_first_token: Optional[FirstTokenCallback] = None,
+        ):
+            key = request_key(messages, available_tools)
+            if self.mode == "replay":
+                entry = self._next("llm", key)
+                if self.realtime and entry["first_token"] is not None:
+                    await asyncio.sleep(entry["first_token"])
+                if on_first_token is not None:
+                    on_first_token()
+                if self.realtime:
+                    await asyncio.sleep(entry["duration"] - (entry["first_token"] or 0))
+                response = load_response(entry["response"])
+                for output in llm.output_items(response):
+                    on_output(output)
+                return response
+
+            start = time.perf_counter()
+            first_token = None
+
+            def record_first_token():
+                nonlocal first_token
+                first_token = time.perf_counter() - start
+                if on_first_token is not None:
+                    on_first_token()
+
+            response = await stream(
+                messages, available_tools, on_output, context=context, on_first_token=record_first_token
+            )
+            self.record(
+                "llm", key, dump_response(response), time.perf_counter() - start, first_token
+            )
+            return response
+
+        llm.query = cassette_query
+        llm.stream = cassette_stream
+        return llm
+
+    def wrap_session(self, session: Any = None) -> CassetteSession:
+        return CassetteSession(self, session)
+
+    async def tool_catalog(self, mcp_client: MCPClient) -> ToolCatalog:
+        """Tool catalog of the current turn, as listed by the server or as recorded"""
+        if self.mode == "replay":
+            return self._tool_catalogs[self._next("tools", None)["key"]]
+        tool_catalog = await mcp_client.tool_catalog()
+        # A catalog is only stored the first time, later turns refer to it by its hash
+        catalog = {"tools": tool_catalog.tools, "annotations": tool_catalog.annotations}
+        key = canonical_hash(catalog)
+        self.record("tools", key, None if key in self._tool_catalogs else catalog, 0.0)
+        self._tool_catalogs[key] = tool_catalog
+        return tool_catalog
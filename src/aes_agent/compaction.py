@@ -0,0 +1,98 @@
+from typing import Callable, Optional, TypedDict
+
+from loguru import logger
+
+from aes_agent.conversation import Conversation
+from aes_agent.utils import ToolCallingResults
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough to enforce a budget"""
+    return (len(text) + 3) // 4
+
+
+class CompactionStats(TypedDict):
+    history_tokens: int
+    tokens_saved: int
+
+
+class HistoryCompactor:
+    """
+    Keeps the tool results resent with every prompt within a token budget.
+
+    When the results of the conversation exceed `token_budget`, the largest
+    results of the oldest turns are truncated to a short preview followed by
+    the call that produced them, so the model can re-fetch them if it needs to,
+    until the history is back under `target_ratio * token_budget`. Compacting
+    well below the budget means it happens once every few turns, not on every
+    turn, since each compaction also invalidates the provider's prompt cache.
+    The `keep_recent_turns` last turns are never compacted.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 20000,
+        target_ratio: float = 0.5,
+        keep_recent_turns: int = 1,
+        min_result_tokens: int = 200,
+        preview_chars: int = 400,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+    ):
+        self.token_budget = token_budget
+        self.target_ratio = target_ratio
+        self.keep_recent_turns = keep_recent_turns
+        self.min_result_tokens = min_result_tokens
+        self.preview_chars = preview_chars
+        self.count_tokens = count_tokens
+
+    def history_tokens(self, conversation: Conversation) -> int:
+        return sum(
+            self.count_tokens(str(tool_call["result"]))
+            for turn in conversation.turns
+            for tool_call in turn["tools_called"]
+        )
+
+    def _compacted_result(self, tool_call: ToolCallingResults, tokens: int) -> str:
+        arguments = ", ".join(f"{name}={value!r}" for name, value in tool_call["arguments"].items())
+        preview = str(tool_call["result"])[: self.preview_chars]
+        return (
+            f"{preview}\n[... result truncated to save context, ~{tokens} tokens elided. "
+            f"Call {tool_call['name']}({arguments}) again to see it in full.]"
+        )
+
+    def _compactable(self, tool_call: ToolCallingResults) -> Optional[int]:
+        """Tokens of the result if it can be compacted, None otherwise"""
+        if tool_call["name"] == "final_answer" or "original_result" in tool_call["metadata"]:
+            return None
+        tokens = self.count_tokens(str(tool_call["result"]))
+        return tokens if tokens >= self.min_result_tokens else None
+
+    def compact(self, conversation: Conversation) -> CompactionStats:
+        history_tokens = self.history_tokens(conversation)
+        stats: CompactionStats = {"history_tokens": history_tokens, "tokens_saved": 0}
+        if history_tokens <= self.token_budget:
+            return stats
+
+        target = self.token_budget * self.target_ratio
+        last_compactable_turn = max(0, len(conversation.turns) - self.keep_recent_turns)
+        first_compacted_turn = None
+        for turn_index, turn in enumerate(conversation.turns[:last_compactable_turn]):
+            for tool_call in turn["tools_called"]:
+                if history_tokens - stats["tokens_saved"] <= target:
+                    break
+                tokens = self._compactable(tool_call)
+                if tokens is None:
+                    continue
+                tool_call["metadata"]["original_result"] = tool_call["result"]
+                tool_call["result"] = self._compacted_result(tool_call, tokens)
+                stats["tokens_saved"] += tokens - self.count_tokens(tool_call["result"])
+                if first_compacted_turn is None:
+                    first_compacted_turn = turn_index
+
+        if first_compacted_turn is not None:
+            conversation.invalidate(first_compacted_turn)
+        logger.info(
+            f"Compacted the history from ~{history_tokens} tokens "
+            f"(budget {self.token_budget}), ~{stats['tokens_saved']} tokens saved"
+        )
+        return stats
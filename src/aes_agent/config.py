@@ -0,0 +1,88 @@
+import yaml
+
+from typing import Optional
+
+from aes_agent.environment import (
+    OfflineSearchEnvironment,
+    OnlineSearchEnvironment,
+    LatencyEnvironment,
+    Environment,
+)
+from aes_agent.llm import LLM, AnthropicLLM, OpenAILLM, ResponseCache
+from aes_agent.agent import Agent
+from aes_agent.mcp.pool import MCPServerPool
+from aes_agent.metrics import MetricsRegistry
+from aes_agent.tracing import Tracer
+from aes_agent.cassette import Cassette
+
+
+def load_config(path: str) -> dict:
+    with open(path, "r") as file:
+        return yaml.safe_load(file)
+
+
+def load_llm(config: dict) -> LLM:
+    model_name = config["agent"]["llm"]["model"]
+    llm_kwargs = {
+        key: config["agent"]["llm"][key]
+        for key in ["timeout", "max_connections", "streaming", "prompt_caching", "temperature"]
+        if key in config["agent"]["llm"]
+    }
+    # `response_cache: true`, or the arguments of the cache (ttl, cache_sampled...). Only
+    # requests with `temperature: 0` are cached unless cache_sampled is set
+    response_cache = config["agent"]["llm"].get("response_cache")
+    if response_cache:
+        llm_kwargs["response_cache"] = ResponseCache(
+            **(response_cache if isinstance(response_cache, dict) else {})
+        )
+    match config["agent"]["llm"]["type"]:
+        case "openai":
+            return OpenAILLM(model=model_name, **llm_kwargs)
+        case "anthropic":
+            return AnthropicLLM(model=model_name, **llm_kwargs)
+        case _:
+            raise Exception(f"{config['agent']['llm']['type']} is not a supported LLM.")
+
+
+def load_environment(config: dict) -> Environment:
+    match config["environment"]["type"]:
+        case "OfflineSearchEnvironment":
+            return OfflineSearchEnvironment(**config["environment"]["args"])
+        case "OnlineSearchEnvironment":
+            return OnlineSearchEnvironment(**config["environment"]["args"])
+        case "LatencyEnvironment":
+            return LatencyEnvironment(**config["environment"]["args"])
+        case _:
+            raise Exception(
+                f"{config['environment']['type']} is not a supported environment."
+            )
+
+
+def load_agent(
+    config: dict,
+    llm: LLM,
+    server_pool: Optional[MCPServerPool] = None,
+    metrics: Optional[MetricsRegistry] = None,
+    tracer: Optional[Tracer] = None,
+    cassette: Optional[Cassette] = None,
+    save_after_run: bool = True,
+) -> Agent:
+    if tracer is None and "trace_path" in config["agent"]:
+        tracer = Tracer(config["agent"]["trace_path"])
+    return Agent(
+        llm=llm,
+        mode=config["agent"]["output_mode"],
+        server_pool=server_pool,
+        history_token_budget=config["agent"].get("history_token_budget"),
+        metrics=metrics,
+        metrics_dir=config["agent"].get("metrics_dir"),
+        memoize_tools=config["agent"].get("memoize_tools", True),
+        tracer=tracer,
+        cassette=cassette,
+        save_after_run=save_after_run,
+    )
+
+
+def load_from_cgf(path: str, cassette: Optional[Cassette] = None) -> tuple[Environment, Agent]:
+    config = load_config(path)
+    return load_environment(config), load_agent(config, load_llm(config), cassette=cassette)
@@ -0,0 +1,42 @@
+from typing import Callable
+
+from aes_agent.utils import Turn
+
+# Renders the turn at a given index as the messages a backend expects
+TurnRenderer = Callable[[int, Turn], list[dict]]
+
+
+class Conversation:
+    """
+    Append-only log of the turns of a run.
+
+    Each backend format is rendered incrementally: a turn is converted to
+    messages once, the first time the conversation is rendered after it was
+    appended, and the rendered messages are reused on every later turn.
+    Turns modified in place (e.g. compacted) must be passed to `invalidate`.
+    """
+
+    def __init__(self):
+        self.turns: list[Turn] = []
+        # format name -> rendered messages, and the index of the first message of each rendered turn
+        self._renderings: dict[str, tuple[list[dict], list[int]]] = {}
+
+    def append(self, turn: Turn):
+        self.turns.append(turn)
+
+    def invalidate(self, turn_index: int):
+        """Drops the renderings of the turns from `turn_index` on, they are rendered again when needed"""
+        for messages, offsets in self._renderings.values():
+            if turn_index < len(offsets):
+                del messages[offsets[turn_index] :]
+                del offsets[turn_index:]
+
+    def messages(self, format_name: str, render_turn: TurnRenderer) -> list[dict]:
+        messages, offsets = self._renderings.setdefault(format_name, ([], []))
+        for i in range(len(offsets), len(self.turns)):
+            offsets.append(len(messages))
+            messages.extend(render_turn(i, self.turns[i]))
+        return messages
+
+    def __len__(self) -> int:
+        return len(self.turns)
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+from collections import OrderedDict
+from typing import Any, Optional
+
+from aes_agent.utils import cache_dir
+
+
+def file_fingerprint(file_path: str) -> str:
+    """
+    Returns a key identifying the current version of a file on disk:
+    its absolute path, size and modification time.
+    """
+    absolute_path = os.path.abspath(file_path)
+    stat = os.stat(absolute_path)
+    raw_key = f"{absolute_path}\0{stat.st_size}\0{stat.st_mtime_ns}"
+    return hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+
+
+def extract_pages(file_path: str) -> list[str]:
+    """Extracts the text of every page of a PDF document with PyMuPDF."""
+    import fitz
+
+    with fitz.open(file_path) as doc:
+        return [page.get_text("text") for page in doc]
+
+
+class DocumentPool:
+    """
+    Bounded LRU pool of open PyMuPDF documents.
+
+    Opening a document parses its cross-reference table, so handles are kept
+    around and shared between calls. A handle is reopened when the file changes.
+    """
+
+    def __init__(self, max_size: int = 8):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._documents: OrderedDict[str, tuple[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_path: str) -> Any:
+        import fitz
+
+        absolute_path = os.path.abspath(file_path)
+        key = file_fingerprint(absolute_path)
+        with self._lock:
+            if absolute_path in self._documents:
+                stored_key, doc = self._documents[absolute_path]
+                if stored_key == key:
+                    self.hits += 1
+                    self._documents.move_to_end(absolute_path)
+                    return doc
+                doc.close()
+                del self._documents[absolute_path]
+
+            self.misses += 1
+            doc = fitz.open(absolute_path)
+            self._documents[absolute_path] = (key, doc)
+            while len(self._documents) > self.max_size:
+                _, (_, evicted_doc) = self._documents.popitem(last=False)
+                evicted_doc.close()
+            return doc
+
+    def page_text(self, file_path: str, page_number: int) -> Optional[str]:
+        """Extracts a single page, without going through the previous ones."""
+        doc = self.get(file_path)
+        if not 0 <= page_number < doc.page_count:
+            return None
+        return doc.load_page(page_number).get_text("text")
+
+    def pages_text(self, file_path: str) -> list[str]:
+        return [page.get_text("text") for page in self.get(file_path)]
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "open": len(self._documents)}
+
+    def close(self):
+        with self._lock:
+            for _, doc in self._documents.values():
+                doc.close()
+            self._documents.clear()
+
+
+class StoredDocument:
+    """
+    Extracted text of a document, memory-mapped from the page store.
+
+    The text file holds every page followed by a newline, the index file holds
+    the byte offset at which each page starts (plus the total length).
+    """
+
+    def __init__(self, text_path: str, offsets: list[int]):
+        self.offsets = offsets
+        self._file = open(text_path, "rb")
+        if offsets[-1] > 0:
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._buffer = b""
+
+    @property
+    def page_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def page(self, page_number: int) -> str:
+        start = self.offsets[page_number]
+        # Each page is followed by a "\n" separator that isn't part of its text
+        end = self.offsets[page_number + 1] - 1
+        return self._buffer[start:end].decode("utf-8")
+
+    def text(self) -> str:
+        return self._buffer[:].decode("utf-8")
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._file.close()
+
+
+class PageStore:
+    """
+    On-disk store of extracted PDF text, keyed by file path, size and mtime.
+
+    A document is extracted once, then every page is served from a memory-mapped
+    file, across calls and across runs.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.path.join(cache_dir(), "pages")
+        os.makedirs(self.root, exist_ok=True)
+        self._documents: dict[str, tuple[str, StoredDocument]] = {}
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        return (
+            os.path.join(self.root, f"{key}.txt"),
+            os.path.join(self.root, f"{key}.json"),
+        )
+
+    def lookup(self, file_path: str) -> Optional[StoredDocument]:
+        """Returns the stored document, or None if it hasn't been extracted yet."""
+        absolute_path = os.path.abspath(file_path)
+        key = file_fingerprint(absolute_path)
+        if absolute_path in self._documents:
+            stored_key, document = self._documents[absolute_path]
+            if stored_key == key:
+                return document
+            # The file changed on disk since it was opened
+            document.close()
+            del self._documents[absolute_path]
+
+        text_path, index_path = self._paths(key)
+        if not (os.path.exists(text_path) and os.path.exists(index_path)):
+            return None
+        with open(index_path, "r") as index_file:
+            offsets = json.load(index_file)
+        document = StoredDocument(text_path, offsets)
+        self._documents[absolute_path] = (key, document)
+        return document
+
+    def store(self, file_path: str, pages: list[str]) -> StoredDocument:
+        """Writes already extracted pages to the store."""
+        key = file_fingerprint(file_path)
+        text_path, index_path = self._paths(key)
+
+        offsets = [0]
+        encoded_pages = []
+        for page in pages:
+            encoded_page = page.encode("utf-8") + b"\n"
+            encoded_pages.append(encoded_page)
+            offsets.append(offsets[-1] + len(encoded_page))
+
+        # Write to temporary files first so that concurrent readers never see a partial entry
+        with open(f"{text_path}.{os.getpid()}.tmp", "wb") as text_file:
+            text_file.write(b"".join(encoded_pages))
+        with open(f"{index_path}.{os.getpid()}.tmp", "w") as index_file:
+            json.dump(offsets, index_file)
+        os.replace(f"{text_path}.{os.getpid()}.tmp", text_path)
+        os.replace(f"{index_path}.{os.getpid()}.tmp", index_path)
+
+        return self.lookup(file_path)
+
+    def get(self, file_path: str) -> StoredDocument:
+        """Returns the stored document, extracting it first if needed."""
+        document = self.lookup(file_path)
+        if document is None:
+            document = self.store(file_path, extract_pages(file_path))
+        return document
@@ -2,11 +2,17 @@ import importlib.resources
 from datetime import datetime
 
 class Environment:
-    def __init__(self):
+    def __init__(self, **kwargs):
         self.turn = 0
         self._mcp_server_script = str(
             importlib.resources.files("aes_agent").joinpath("mcp/servers/default.py")
         )
+        self._mcp_server_args: list[str] = []
+        # Bundled servers can run inside the agent's process instead of a stdio subprocess
+        self._mcp_server_module = "aes_agent.mcp.servers.default"
+        self.in_process = False
+        if "in_process" in kwargs:
+            self.in_process = kwargs["in_process"]
 
     @property
     def is_running(self) -> bool:
@@ -25,7 +31,7 @@ class Environment:
 
 class OfflineSearchEnvironment(Environment):
     def __init__(self, **kwargs):
-        super().__init__()
+        super().__init__(**kwargs)
         self.max_turns = 5
         if "max_turns" in kwargs:
             self.max_turns = kwargs["max_turns"]
@@ -38,6 +44,12 @@ class OfflineSearchEnvironment(Environment):
                 "mcp/servers/local_search.py"
             )
         )
+        self._mcp_server_module = "aes_agent.mcp.servers.local_search"
+        self._mcp_server_args = ["--available-files", *self.available_files]
+        # Processes extracting the files before a stdio server starts (None: one per core, 0: none,
+        # the server extracts them on its event loop as servers mounted in-process always do)
+        if "warmup_workers" in kwargs:
+            self._mcp_server_args += ["--warmup-workers", str(kwargs["warmup_workers"])]
 
     @property
     def state(self) -> str:
@@ -58,7 +70,7 @@ class OfflineSearchEnvironment(Environment):
 
 class OnlineSearchEnvironment(Environment):
     def __init__(self, **kwargs):
-        super().__init__()
+        super().__init__(**kwargs)
         self.max_turns = 5
         if "max_turns" in kwargs:
             self.max_turns = kwargs["max_turns"]
@@ -75,6 +87,12 @@ class OnlineSearchEnvironment(Environment):
                 "mcp/servers/online_search.py"
             )
         )
+        self._mcp_server_module = "aes_agent.mcp.servers.online_search"
+        # Time to live (in seconds) of cached search results and web pages
+        if "search_cache_ttl" in kwargs:
+            self._mcp_server_args += ["--search-cache-ttl", str(kwargs["search_cache_ttl"])]
+        if "page_cache_ttl" in kwargs:
+            self._mcp_server_args += ["--page-cache-ttl", str(kwargs["page_cache_ttl"])]
 
     @property
     def state(self) -> str:
@@ -92,3 +110,30 @@ class OnlineSearchEnvironment(Environment):
         if self.turn >= self.max_turns:
             return False
         return True
+
+
+class LatencyEnvironment(Environment):
+    """Simulated tools with configurable latency and result size, for load tests"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.max_turns = 5
+        if "max_turns" in kwargs:
+            self.max_turns = kwargs["max_turns"]
+        self._mcp_server_script = str(
+            importlib.resources.files("aes_agent").joinpath("mcp/servers/latency.py")
+        )
+        self._mcp_server_module = "aes_agent.mcp.servers.latency"
+        # Tool latency (log-normal, in seconds) and result size (in characters)
+        if "tool_latency_median" in kwargs:
+            self._mcp_server_args += ["--latency-median", str(kwargs["tool_latency_median"])]
+        if "tool_latency_sigma" in kwargs:
+            self._mcp_server_args += ["--latency-sigma", str(kwargs["tool_latency_sigma"])]
+        if "payload_size" in kwargs:
+            self._mcp_server_args += ["--payload-size", str(kwargs["payload_size"])]
+
+    @property
+    def is_running(self) -> bool:
+        if self.turn >= self.max_turns:
+            return False
+        return True
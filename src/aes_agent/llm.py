@@ -1,53 +1,327 @@
 import os
 import abc
+import asyncio
+import importlib
+import weakref
+
+import httpx
 
 from loguru import logger
 from abc import ABC
-from typing import Any, Optional
+from typing import Any, Callable, Optional
+
+from aes_agent.cache import PersistentCache
+from aes_agent.utils import cache_dir, canonical_hash
 
 LLMResponse = Any
+# Called with each output item (text, tool call...) as soon as it is complete
+OutputCallback = Callable[[Any], None]
+# Called once, when the first generated token is received
+FirstTokenCallback = Callable[[], None]
+
+# One connection pool per event loop, shared by every LLM backend running on it (with its
+# maximum number of connections)
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple[httpx.AsyncClient, int]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def shared_http_client(max_connections: int = 100) -> httpx.AsyncClient:
+    """Connection pool of the running event loop, its limits are set by the first caller"""
+    loop = asyncio.get_running_loop()
+    if loop not in _http_clients:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            )
+        )
+        _http_clients[loop] = (client, max_connections)
+    client, pool_max_connections = _http_clients[loop]
+    if max_connections != pool_max_connections:
+        logger.warning(
+            f"The shared HTTP client of this event loop allows {pool_max_connections} connections, "
+            f"ignoring max_connections={max_connections}"
+        )
+    return client
+
+
+async def aclose_shared_http_client():
+    """Closes the connection pool of the running event loop, once its LLM backends are done with it"""
+    client, _ = _http_clients.pop(asyncio.get_running_loop(), (None, None))
+    if client is not None:
+        await client.aclose()
+
+
+def dump_response(response: LLMResponse) -> dict:
+    """SDK response with the path of its class, so that it can be rebuilt by `load_response`"""
+    return {
+        "type": f"{type(response).__module__}.{type(response).__qualname__}",
+        "data": response.model_dump(mode="json"),
+    }
+
+
+def load_response(dump: dict) -> LLMResponse:
+    module_name, class_name = dump["type"].rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name).model_validate(dump["data"])
+
+
+class ResponseCache:
+    """
+    Exact-match cache of LLM responses, keyed on a canonical hash of the whole request
+    (model, messages, tool schemas, sampling parameters...).
+
+    Responses are kept in memory (LRU) and in SQLite, for `ttl` seconds. Only requests
+    with a temperature of 0 are cached, unless `cache_sampled`: providers sample at a
+    temperature of 1 when none is sent. Incomplete responses (e.g. cut by max_tokens)
+    are never stored.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = 7 * 24 * 3600,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 10000,
+        cache_sampled: bool = False,
+    ):
+        self.store = PersistentCache(
+            path or os.path.join(cache_dir(), "llm.sqlite"),
+            default_ttl=ttl,
+            max_memory_entries=max_memory_entries,
+            max_disk_entries=max_disk_entries,
+        )
+        self.cache_sampled = cache_sampled
+        self.bypassed = 0
+
+    def lookup(self, request: dict) -> tuple[Optional[str], Optional[LLMResponse]]:
+        """Key of the request (None if it bypasses the cache) and its cached response, if any"""
+        if request.get("temperature", 1) > 0 and not self.cache_sampled:
+            self.bypassed += 1
+            return None, None
+        key = canonical_hash(request)
+        entry = self.store.get(key)
+        if entry is None:
+            return key, None
+        logger.info(f"LLM response cache hit ({key[:12]})")
+        return key, load_response(entry["value"])
+
+    def save(self, key: Optional[str], response: LLMResponse, complete: bool):
+        if key is not None and complete:
+            self.store.set(key, dump_response(response))
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {**self.store.stats, "bypassed": self.bypassed}
+
+    def close(self):
+        self.store.close()
+
+
+def replay_stream(
+    llm: "LLM",
+    response: LLMResponse,
+    on_output: OutputCallback,
+    on_first_token: Optional[FirstTokenCallback],
+) -> LLMResponse:
+    """Fires the callbacks of a stream for an already complete response"""
+    if on_first_token is not None:
+        on_first_token()
+    for output in llm.output_items(response):
+        on_output(output)
+    return response
 
 
 class LLM(ABC):
+    # Opt-in cache of the responses to identical requests
+    response_cache: Optional[ResponseCache] = None
+
     def __init__(self, model: str):
         self._client: Any = None
 
+    def _lookup(self, request: dict) -> tuple[Optional[str], Optional[LLMResponse]]:
+        if self.response_cache is None:
+            return None, None
+        return self.response_cache.lookup(request)
+
+    def _save(self, key: Optional[str], response: LLMResponse, complete: bool):
+        if self.response_cache is not None:
+            self.response_cache.save(key, response, complete)
+
     @abc.abstractmethod
     def get_text(self, response: Any) -> str:
         pass
 
     @abc.abstractmethod
-    def query(self, system_prompt: str, user_prompt: str) -> str:
+    async def query(
+        self, messages: list[dict], available_tools: list = [], context: str = ""
+    ) -> LLMResponse:
         pass
 
+    @abc.abstractmethod
+    async def stream(
+        self,
+        messages: list[dict],
+        available_tools: list,
+        on_output: OutputCallback,
+        context: str = "",
+        on_first_token: Optional[FirstTokenCallback] = None,
+    ) -> LLMResponse:
+        pass
+
+    @abc.abstractmethod
+    def output_items(self, response: LLMResponse) -> list:
+        pass
+
+    @abc.abstractmethod
+    def usage(self, response: LLMResponse) -> dict:
+        """Token counts of a response: input, output, and input read from / written to the prompt cache"""
+        pass
 
-class OpenAILLM(ABC):
-    def __init__(self, model: str):
-        from openai import OpenAI
 
-        self._client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+class OpenAILLM(LLM):
+    def __init__(
+        self,
+        model: str,
+        timeout: float = 600,
+        max_connections: int = 100,
+        streaming: bool = True,
+        temperature: Optional[float] = None,
+        response_cache: Optional[ResponseCache] = None,
+    ):
         self.model = model
+        self.streaming = streaming
+        self.temperature = temperature
+        self.response_cache = response_cache
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def _client(self):
+        """Async SDK client bound to the running event loop"""
+        from openai import AsyncOpenAI
+
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            self._clients[loop] = AsyncOpenAI(
+                api_key=os.environ["OPENAI_API_KEY"],
+                timeout=self.timeout,
+                http_client=shared_http_client(self.max_connections),
+            )
+        return self._clients[loop]
 
     def get_text(self, response: LLMResponse) -> str:
         return response.output_text
 
-    def query(self, messages: list[dict], available_tools: list = []) -> LLMResponse:
-        logger.info(f"Sent the following to {self.__class__.__name__}: {str(messages)}")
-        response = self._client.responses.create(
-            model=self.model, input=messages, tools=available_tools
+    def _with_context(self, messages: list[dict], context: str) -> list[dict]:
+        # Volatile context goes last, so that it doesn't break the cached prompt prefix
+        if not context:
+            return messages
+        return [*messages, {"role": "user", "content": context}]
+
+    def _request(self, messages: list[dict], available_tools: list, context: str = "") -> dict:
+        request = {
+            "model": self.model,
+            "input": self._with_context(messages, context),
+            "tools": available_tools,
+        }
+        if self.temperature is not None:
+            request["temperature"] = self.temperature
+        return request
+
+    async def query(
+        self, messages: list[dict], available_tools: list = [], context: str = ""
+    ) -> LLMResponse:
+        request = self._request(messages, available_tools, context)
+        key, response = self._lookup(request)
+        if response is not None:
+            return response
+        logger.info(f"Sent the following to {self.__class__.__name__}: {str(request['input'])}")
+        response = await self._client.responses.create(**request)
+        logger.info(
+            f"Received the following from {self.__class__.__name__}: {response.output_text}"
         )
+        self._save(key, response, response.status == "completed")
+        return response
+
+    async def stream(
+        self,
+        messages: list[dict],
+        available_tools: list,
+        on_output: OutputCallback,
+        context: str = "",
+        on_first_token: Optional[FirstTokenCallback] = None,
+    ) -> LLMResponse:
+        request = self._request(messages, available_tools, context)
+        key, response = self._lookup(request)
+        if response is not None:
+            return replay_stream(self, response, on_output, on_first_token)
+        logger.info(f"Streaming the following to {self.__class__.__name__}: {str(request['input'])}")
+        events = await self._client.responses.create(**request, stream=True)
+        async for event in events:
+            if on_first_token is not None and event.type.endswith(".delta"):
+                on_first_token()
+                on_first_token = None
+            if event.type == "response.output_item.done":
+                on_output(event.item)
+            elif event.type == "response.completed":
+                response = event.response
+        if response is None:
+            raise Exception(f"{self.__class__.__name__} stream ended before the response was completed")
         logger.info(
             f"Received the following from {self.__class__.__name__}: {response.output_text}"
         )
+        self._save(key, response, response.status == "completed")
         return response
 
+    def output_items(self, response: LLMResponse) -> list:
+        return response.output
 
-class AnthropicLLM(ABC):
-    def __init__(self, model: str):
-        from anthropic import Anthropic
+    def usage(self, response: LLMResponse) -> dict:
+        if response.usage is None:
+            return {}
+        return {
+            "input_tokens": response.usage.input_tokens,
+            "output_tokens": response.usage.output_tokens,
+            "cache_read_input_tokens": response.usage.input_tokens_details.cached_tokens,
+            "cache_creation_input_tokens": 0,
+        }
 
-        self._client = Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+
+class AnthropicLLM(LLM):
+    def __init__(
+        self,
+        model: str,
+        timeout: float = 600,
+        max_connections: int = 100,
+        streaming: bool = True,
+        prompt_caching: bool = True,
+        temperature: Optional[float] = None,
+        response_cache: Optional[ResponseCache] = None,
+    ):
         self.model = model
+        self.streaming = streaming
+        self.prompt_caching = prompt_caching
+        self.temperature = temperature
+        self.response_cache = response_cache
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def _client(self):
+        """Async SDK client bound to the running event loop"""
+        from anthropic import AsyncAnthropic
+
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            self._clients[loop] = AsyncAnthropic(
+                api_key=os.environ["ANTHROPIC_API_KEY"],
+                timeout=self.timeout,
+                http_client=shared_http_client(self.max_connections),
+            )
+        return self._clients[loop]
 
     def get_text(self, response: LLMResponse) -> str:
         received_texts = []
@@ -65,7 +339,21 @@ class AnthropicLLM(ABC):
                 raise Exception("Unknown content type for Anthropic answer")
         return "\n".join(received_texts)
 
-    def query(self, messages: list[dict], available_tools: list = []) -> LLMResponse:
+    @staticmethod
+    def _with_cache_breakpoint(message: dict) -> dict:
+        """Copy of a message whose last content block is marked as the end of a cacheable prefix"""
+        content = message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        else:
+            content = [
+                block if isinstance(block, dict) else block.model_dump(exclude_none=True)
+                for block in content
+            ]
+        content[-1] = {**content[-1], "cache_control": {"type": "ephemeral"}}
+        return {**message, "content": content}
+
+    def _request(self, messages: list[dict], available_tools: list, context: str = "") -> dict:
         system_prompt = None
         new_messages_list = []
         for message in messages:
@@ -73,11 +361,89 @@ class AnthropicLLM(ABC):
                 system_prompt = message["content"]
             else:
                 new_messages_list.append(message)
-        response = self._client.messages.create(
-            model=self.model,
-            messages=new_messages_list,
-            tools=available_tools,
-            max_tokens=2048,
-            system=system_prompt,
-        )
+
+        if self.prompt_caching:
+            # Tools, system prompt and history up to the previous turn are the same from a
+            # turn to the next one: each of them ends with a cache breakpoint
+            if available_tools:
+                available_tools = [
+                    *available_tools[:-1],
+                    {**available_tools[-1], "cache_control": {"type": "ephemeral"}},
+                ]
+            if system_prompt:
+                system_prompt = [
+                    {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+                ]
+            if new_messages_list:
+                new_messages_list[-1] = self._with_cache_breakpoint(new_messages_list[-1])
+
+        # Volatile context goes after the last breakpoint
+        if context:
+            if new_messages_list and new_messages_list[-1]["role"] == "user":
+                last_message = new_messages_list[-1]
+                content = last_message["content"]
+                if isinstance(content, str):
+                    content = [{"type": "text", "text": content}]
+                new_messages_list[-1] = {
+                    **last_message,
+                    "content": [*content, {"type": "text", "text": context}],
+                }
+            else:
+                new_messages_list.append({"role": "user", "content": context})
+
+        request = {
+            "model": self.model,
+            "messages": new_messages_list,
+            "tools": available_tools,
+            "max_tokens": 2048,
+        }
+        if system_prompt:
+            request["system"] = system_prompt
+        if self.temperature is not None:
+            request["temperature"] = self.temperature
+        return request
+
+    async def query(
+        self, messages: list[dict], available_tools: list = [], context: str = ""
+    ) -> LLMResponse:
+        request = self._request(messages, available_tools, context)
+        key, response = self._lookup(request)
+        if response is not None:
+            return response
+        response = await self._client.messages.create(**request)
+        self._save(key, response, response.stop_reason != "max_tokens")
         return response
+
+    async def stream(
+        self,
+        messages: list[dict],
+        available_tools: list,
+        on_output: OutputCallback,
+        context: str = "",
+        on_first_token: Optional[FirstTokenCallback] = None,
+    ) -> LLMResponse:
+        request = self._request(messages, available_tools, context)
+        key, response = self._lookup(request)
+        if response is not None:
+            return replay_stream(self, response, on_output, on_first_token)
+        async with self._client.messages.stream(**request) as stream:
+            async for event in stream:
+                if on_first_token is not None and event.type == "content_block_delta":
+                    on_first_token()
+                    on_first_token = None
+                if event.type == "content_block_stop":
+                    on_output(event.content_block)
+            response = await stream.get_final_message()
+        self._save(key, response, response.stop_reason != "max_tokens")
+        return response
+
+    def output_items(self, response: LLMResponse) -> list:
+        return response.content
+
+    def usage(self, response: LLMResponse) -> dict:
+        return {
+            "input_tokens": response.usage.input_tokens,
+            "output_tokens": response.usage.output_tokens,
+            "cache_read_input_tokens": response.usage.cache_read_input_tokens or 0,
+            "cache_creation_input_tokens": response.usage.cache_creation_input_tokens or 0,
+        }
@@ -1,4 +1,9 @@
+import time
+
 from aes_agent.utils import ToolCallingResults, parse_function_call, Turn, format_args
+from aes_agent.mcp.client import ToolCatalog
+from aes_agent.conversation import Conversation
+from aes_agent.tracing import span
 from loguru import logger
 
 
@@ -17,28 +22,52 @@ def tool_to_docllm_format(tool: dict) -> str:
     return f"{tool['name']}({', '.join(args_strings)}) => {tool['description']}"
 
 
+def tools_to_docllm_format(tools: list[dict]) -> str:
+    return "\n".join(tool_to_docllm_format(tool) for tool in tools)
+
+
+def render_turn(i: int, turn: Turn) -> list[dict]:
+    """Renders each tool call of a turn as an assistant message"""
+    messages = []
+    for tool_call in turn["tools_called"]:
+        tool_result_string = f"<Tool execution (turn {i + 1})>{tool_call['name']}({format_args(tool_call['arguments'])}) = {tool_call['result']}</Tool execution (turn {i + 1})>"
+        messages.append({"role": "assistant", "content": tool_result_string})
+    return messages
+
+
+def log_usage(llm, response) -> dict:
+    """Token usage of a turn, including prompt cache hits (cache_read) and misses (cache_creation)"""
+    usage = llm.usage(response)
+    logger.info(f"Token usage: {usage}")
+    return usage
+
+
 async def custom_parser(
-    session, environment, llm, available_tools, task, history: list[Turn]
+    session, environment, llm, tool_catalog: ToolCatalog, task, conversation: Conversation
 ) -> Turn:
-    tools_strings: list[str] = []
-    for tool in available_tools:
-        tools_strings.append(tool_to_docllm_format(tool))
-    system_prompt = f"{environment.state}<tools>{'\n'.join(tools_strings)}</tools>\n<answer template>\nReasoning: {{your_reasoning (string)}}\nAction: func(arg1=value1, ...)</answer template>\nUsing the tools at your disposal, complete the user's request by answering following exactly the template."
+    start = time.perf_counter()
+    available_tools = tool_catalog.tools
+    tools_string = tool_catalog.render("custom-parser", tools_to_docllm_format)
+    system_prompt = f"<tools>{tools_string}</tools>\n<answer template>\nReasoning: {{your_reasoning (string)}}\nAction: func(arg1=value1, ...)</answer template>\nUsing the tools at your disposal, complete the user's request by answering following exactly the template."
     user_prompt = task
 
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
+        *conversation.messages("text", render_turn),
     ]
 
-    if history:
-        for i, turn in enumerate(history):
-            # Add argument: with or without reasoning
-            for tool_call in turn["tools_called"]:
-                tool_result_string = f"<Tool execution (turn {i + 1})>{tool_call['name']}({format_args(tool_call['arguments'])}) = {tool_call['result']}</Tool execution (turn {i + 1})>"
-                messages.append({"role": "assistant", "content": tool_result_string})
-
-    answer = llm.get_text(llm.query(messages))
+    prompt_build_seconds = time.perf_counter() - start
+    query_start = time.perf_counter()
+    with span("llm.query", model=llm.model, messages=len(messages)):
+        response = await llm.query(messages, context=environment.state)
+    llm_latency = time.perf_counter() - query_start
+    metrics = {
+        "prompt_build_seconds": prompt_build_seconds,
+        "llm_latency_seconds": llm_latency,
+        "time_to_first_token_seconds": llm_latency,
+    }
+    answer = llm.get_text(response)
     reasoning = answer.split("Action:")[0].replace("Reasoning: ", "").strip()
     action = answer.split("Action: ")[1].strip()
     parsed_function = parse_function_call(action)
@@ -47,6 +76,8 @@ async def custom_parser(
         return {
             "reasoning": "<Tool error>",
             "tools_called": [],
+            "usage": log_usage(llm, response),
+            "metrics": metrics,
         }
 
     function_name = ""
@@ -66,10 +97,18 @@ async def custom_parser(
     logger.info(
         f"Calling the function '{function_name}' with the following arguments: {arguments}"
     )
-    toolcall_result = await session.call_tool(function_name, arguments)
+    tool_start = time.perf_counter()
+    with span("call_tool", tool=function_name, arguments=arguments):
+        toolcall_result = await session.call_tool(function_name, arguments)
+    tool_metadata = {
+        "duration_seconds": time.perf_counter() - tool_start,
+        "result_size": len(toolcall_result.content[0].text.encode()),
+    }
     logger.info(f"Results of '{function_name}': {toolcall_result.content[0].text}")
     result: Turn = {
         "reasoning": reasoning,
-        "tools_called": [{"name": function_name, "arguments": arguments, "result": toolcall_result.content[0].text, "id": None, "metadata": {}}]
+        "tools_called": [{"name": function_name, "arguments": arguments, "result": toolcall_result.content[0].text, "id": None, "metadata": tool_metadata}],
+        "usage": log_usage(llm, response),
+        "metrics": metrics,
     }
     return result
@@ -1,14 +1,207 @@
+import asyncio
 import json
+import time
 
-from aes_agent.utils import ToolCallingResults, Turn, parse_function_call, format_args
+from typing import Any, Callable, Optional
+from aes_agent.utils import ToolCallingResults, Turn
 from aes_agent.llm import AnthropicLLM, OpenAILLM
+from aes_agent.mcp.client import ToolCatalog
+from aes_agent.conversation import Conversation
+from aes_agent.logic.custom_parser import log_usage, render_turn
+from aes_agent.tracing import span
 from loguru import logger
 
 
+async def call_tool(session, tool_call: ToolCallingResults, semaphore: asyncio.Semaphore):
+    """Runs a single tool call, storing its result (or its error) in place."""
+    if "arguments_error" in tool_call["metadata"]:
+        logger.error(f"Error while calling {tool_call['name']}: {tool_call['metadata']['arguments_error']}")
+        tool_call["result"] = f"Error: {tool_call['metadata']['arguments_error']}"
+        tool_call["metadata"]["is_error"] = True
+        tool_call["metadata"]["duration_seconds"] = 0.0
+        return
+    async with semaphore:
+        logger.info(
+            f"Calling tool {tool_call['name']} with the following arguments: {tool_call['arguments']}"
+        )
+        start = time.perf_counter()
+        try:
+            with span("call_tool", tool=tool_call["name"], arguments=tool_call["arguments"]):
+                toolcall_result = await session.call_tool(tool_call["name"], tool_call["arguments"])
+        except Exception as e:
+            logger.error(f"Error while calling {tool_call['name']}: {e}")
+            tool_call["result"] = f"Error: {e}"
+            tool_call["metadata"]["is_error"] = True
+            tool_call["metadata"]["duration_seconds"] = time.perf_counter() - start
+            return
+        tool_call["metadata"]["duration_seconds"] = time.perf_counter() - start
+    tool_call["result"] = toolcall_result.content[0].text if toolcall_result.content else ""
+    tool_call["metadata"]["is_error"] = toolcall_result.isError
+    tool_call["metadata"]["result_size"] = len(tool_call["result"].encode())
+    if toolcall_result.isError:
+        logger.error(f"Error: {tool_call['result']}")
+    else:
+        logger.success(f"Result of {tool_call['name']}: {tool_call['result']}")
+
+
+async def call_tools(
+    session, tools_called: list[ToolCallingResults], max_concurrent_tool_calls: int
+) -> list[ToolCallingResults]:
+    """
+    Runs every tool call of a turn concurrently (at most `max_concurrent_tool_calls`
+    at a time). Results are kept in the order in which the model emitted the calls.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent_tool_calls)
+    await asyncio.gather(*[call_tool(session, tool_call, semaphore) for tool_call in tools_called])
+    return tools_called
+
+
+async def query_and_call_tools(
+    session,
+    llm,
+    messages: list[dict],
+    available_tools: list,
+    to_tool_call: Callable[[Any], Optional[ToolCallingResults]],
+    max_concurrent_tool_calls: int,
+    context: str = "",
+) -> tuple[Any, list[ToolCallingResults], dict[str, float]]:
+    """
+    Queries the LLM and runs the tool calls found in its response (`to_tool_call`
+    turns an output item into a tool call, or None). When the LLM streams, each
+    tool call is dispatched as soon as its arguments are complete, while the
+    rest of the response is still being generated.
+    Also returns the LLM's latency and time to first token.
+    """
+    start = time.perf_counter()
+    if not llm.streaming:
+        with span("llm.query", model=llm.model, messages=len(messages)):
+            response = await llm.query(messages, available_tools=available_tools, context=context)
+        latency = time.perf_counter() - start
+        timings = {"llm_latency_seconds": latency, "time_to_first_token_seconds": latency}
+        tools_called = [
+            tool_call
+            for tool_call in map(to_tool_call, llm.output_items(response))
+            if tool_call is not None
+        ]
+        await call_tools(session, tools_called, max_concurrent_tool_calls)
+        return response, tools_called, timings
+
+    semaphore = asyncio.Semaphore(max_concurrent_tool_calls)
+    tools_called: list[ToolCallingResults] = []
+    tool_tasks: list[asyncio.Task] = []
+    timings: dict[str, float] = {}
+
+    def on_first_token():
+        timings["time_to_first_token_seconds"] = time.perf_counter() - start
+
+    def on_output(output):
+        tool_call = to_tool_call(output)
+        if tool_call is None:
+            return
+        tools_called.append(tool_call)
+        tool_tasks.append(
+            asyncio.create_task(
+                call_tool(session, tool_call, semaphore), name=f"tool {tool_call['name']}"
+            )
+        )
+
+    try:
+        with span("llm.stream", model=llm.model, messages=len(messages)):
+            response = await llm.stream(
+                messages, available_tools, on_output, context=context, on_first_token=on_first_token
+            )
+    except BaseException:
+        for tool_task in tool_tasks:
+            tool_task.cancel()
+        raise
+    timings["llm_latency_seconds"] = time.perf_counter() - start
+    await asyncio.gather(*tool_tasks)
+    return response, tools_called, timings
+
+
+def openai_tool_call(output) -> Optional[ToolCallingResults]:
+    if output.type != "function_call":
+        return None
+    tool_call = {"name": output.name, "arguments": {}, "result": None, "id": output.id, "metadata": {}}
+    try:
+        tool_call["arguments"] = json.loads(output.arguments)
+    except json.JSONDecodeError as e:
+        # Reported to the model as the call's error, the other calls of the turn still run
+        tool_call["metadata"]["arguments_error"] = f"Invalid JSON arguments ({e}): {output.arguments}"
+    return tool_call
+
+
+def anthropic_tool_call(content) -> Optional[ToolCallingResults]:
+    if content.type != "tool_use":
+        return None
+    return {"name": content.name, "arguments": content.input, "result": None, "id": content.id, "metadata": {}}
+
+
+def tools_to_openai_format(available_tools: list[dict]) -> list[dict]:
+    tools_openai_format = []
+    
+    for tool in available_tools:
+        tool_openai_format = {
+            "type": "function",
+            "name": tool["name"],
+            "description": tool["description"],
+            "additionalProperties": False,
+        }
+        properties_openai_format = {}
+        for argument_name, argument_properties in tool["input_schema"][
+            "properties"
+        ].items():
+            properties_openai_format[argument_name] = {
+                "type": argument_properties["type"]
+                if "type" in argument_properties
+                else "string"
+            }
+
+        tool_openai_format["parameters"] = {
+            "type": "object",
+            "properties": properties_openai_format,
+            "required": list(properties_openai_format.keys()),
+            "required": tool["input_schema"]["required"],
+        }
+        tools_openai_format.append(tool_openai_format)
+    return tools_openai_format
+
+
+def render_anthropic_turn(i: int, turn: Turn) -> list[dict]:
+    if not turn["tools_called"]:
+        return []
+    # Every tool_use block of a response is answered in a single user message
+    return [
+        {
+            "role": "assistant",
+            "content": turn["tools_called"][0]["metadata"]["assistant_full_content"],
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "tool_result",
+                    "tool_use_id": tool_call["id"],
+                    "content": tool_call["result"],
+                    "is_error": tool_call["metadata"]["is_error"],
+                }
+                for tool_call in turn["tools_called"]
+            ],
+        },
+    ]
+
+
 async def native(
-    session, environment, llm, available_tools, task, history: list[Turn]
+    session,
+    environment,
+    llm,
+    tool_catalog: ToolCatalog,
+    task,
+    conversation: Conversation,
+    max_concurrent_tool_calls: int = 4,
 ) -> Turn:
-    system_prompt = f"{environment.state}\nYour role is to complete the user's task by using tools that are provided to you. You will make sure to explain your reasoning before using a particular tool."
+    start = time.perf_counter()
+    system_prompt = f"Your role is to complete the user's task by using tools that are provided to you. You will make sure to explain your reasoning before using a particular tool."
     user_prompt = task
     messages = [
         {"role": "system", "content": system_prompt},
@@ -16,120 +209,57 @@ async def native(
     ]
 
     if isinstance(llm, OpenAILLM):
-        if history:
-            for i, turn in enumerate(history):
-                # Add argument: with or without reasoning
-                for tool_call in turn["tools_called"]:
-                    tool_result_string = f"<Tool execution (turn {i + 1})>{tool_call['name']}({format_args(tool_call['arguments'])}) = {tool_call['result']}</Tool execution (turn {i + 1})>"
-                    messages.append({"role": "assistant", "content": tool_result_string})
-
-        tools_openai_format = []
-        
-        for tool in available_tools:
-            tool_openai_format = {
-                "type": "function",
-                "name": tool["name"],
-                "description": tool["description"],
-                "additionalProperties": False,
-            }
-            properties_openai_format = {}
-            for argument_name, argument_properties in tool["input_schema"][
-                "properties"
-            ].items():
-                properties_openai_format[argument_name] = {
-                    "type": argument_properties["type"]
-                    if "type" in argument_properties
-                    else "string"
-                }
+        messages.extend(conversation.messages("text", render_turn))
 
-            tool_openai_format["parameters"] = {
-                "type": "object",
-                "properties": properties_openai_format,
-                "required": list(properties_openai_format.keys()),
-                "required": tool["input_schema"]["required"],
-            }
-            tools_openai_format.append(tool_openai_format)
+        tools_openai_format = tool_catalog.render("openai", tools_to_openai_format)
 
-        response = llm.query(messages, available_tools=tools_openai_format)
-        tools_called: list[ToolCallingResults] = []
+        prompt_build_seconds = time.perf_counter() - start
+        response, tools_called, timings = await query_and_call_tools(
+            session,
+            llm,
+            messages,
+            tools_openai_format,
+            openai_tool_call,
+            max_concurrent_tool_calls,
+            context=environment.state,
+        )
         reasoning = "<no reasoning>"
         for output in response.output:
             if output.type == "message":
                 reasoning = output.content
-            elif output.type == "function_call":
-                arguments = json.loads(output.arguments)
-                logger.info(
-                    f"Calling tool {output.name} with the following arguments: {arguments}"
-                )
-                toolcall_result = await session.call_tool(output.name, arguments)
-                logger.info(f"Result: {toolcall_result}")
-                tools_called.append({"name": output.name, "arguments": arguments, "result": toolcall_result.content[0].text, "id": output.id, "metadata": {}})
 
         return {
             "reasoning": reasoning,
-            "tools_called": tools_called
+            "tools_called": tools_called,
+            "usage": log_usage(llm, response),
+            "metrics": {"prompt_build_seconds": prompt_build_seconds, **timings},
         }
 
     elif isinstance(llm, AnthropicLLM):
-        for tool_result in history:
-            for tool_call in tool_result["tools_called"]:
-                    messages.append(
-                        {
-                            "role": "assistant",
-                            "content": [
-                                tool_call["metadata"]["assistant_full_content"],
-                                tool_call["metadata"]["tool_full_content"],
-                            ],
-                        }
-                    )
-                    messages.append(
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "tool_result",
-                                    "tool_use_id": tool_call["id"],
-                                    "content": tool_call["result"],
-                                }
-                            ],
-                        }
-                    )
-        response = llm.query(messages, available_tools=available_tools)
+        messages.extend(conversation.messages("anthropic", render_anthropic_turn))
+        prompt_build_seconds = time.perf_counter() - start
+        response, tools_called, timings = await query_and_call_tools(
+            session,
+            llm,
+            messages,
+            tool_catalog.tools,
+            anthropic_tool_call,
+            max_concurrent_tool_calls,
+            context=environment.state,
+        )
         logger.info(f"Response length: {len(response.content)}")
         reasoning = "<no reasoning>"
         for content in response.content:
             if content.type == "text":
                 reasoning = content.text
-                assistant_content = content
-            if content.type == "tool_use":
-                tool_name = content.name
-                tool_args = content.input
-                tool_content = content
-                logger.info(
-                    f"Calling tool {tool_name} with the following arguments: {tool_args}"
-                )
-                toolcall_result = await session.call_tool(tool_name, tool_args)
-                if toolcall_result.isError:
-                    logger.error(f"Error: {toolcall_result.content[0].text}")
-                else:
-                    logger.success(f"Result: {toolcall_result.content[0].text}")
-
-                return {
-                    "reasoning": reasoning,
-                    "tools_called": [
-                        {
-                            "name": tool_name,
-                            "arguments": tool_args,
-                            "result": toolcall_result.content[0].text,
-                            "id": content.id,
-                            "metadata": {
-                                "assistant_full_content": assistant_content,
-                                "tool_full_content": tool_content,
-                            },
-                        }
-                    ],
-                }
+        for tool_call in tools_called:
+            tool_call["metadata"]["assistant_full_content"] = response.content
+
+        return {
+            "reasoning": reasoning,
+            "tools_called": tools_called,
+            "usage": log_usage(llm, response),
+            "metrics": {"prompt_build_seconds": prompt_build_seconds, **timings},
+        }
     else:
         raise Exception(f"No 'native' tool calling for LLM of type {llm}")
-
-    return {"reasoning": "<No reasoning with native tool use>", "tools_called": []}
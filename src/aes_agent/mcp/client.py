@@ -1,41 +1,134 @@
 import asyncio
+import importlib
 import os
 
-from typing import Optional
+from typing import Any, Callable, Optional
 from contextlib import AsyncExitStack
-from mcp import ClientSession, StdioServerParameters
+from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
+from mcp.shared.memory import create_connected_server_and_client_session
+
+
+class ToolCatalog:
+    """Tools exposed by a server, converted at most once to each format an LLM needs"""
+
+    def __init__(self, tools: list[dict], annotations: Optional[dict[str, dict]] = None):
+        self.tools = tools
+        # Tool name -> annotations declared by the server (hints like readOnlyHint), kept
+        # apart from `tools` which is sent as is to the LLM providers
+        self.annotations = annotations or {}
+        self._renderings: dict[str, Any] = {}
+
+    def render(self, format_name: str, formatter: Callable[[list[dict]], Any]) -> Any:
+        if format_name not in self._renderings:
+            self._renderings[format_name] = formatter(self.tools)
+        return self._renderings[format_name]
+
+
+def server_parameters(server_script_path: str, server_args: list[str] = []) -> StdioServerParameters:
+    return StdioServerParameters(
+        command="python",
+        args=[server_script_path, *server_args],
+        env=os.environ
+    )
+
+
+def is_tool_list_changed(message) -> bool:
+    return isinstance(message, types.ServerNotification) and isinstance(
+        message.root, types.ToolListChangedNotification
+    )
+
+
+async def fetch_tool_catalog(session: ClientSession) -> ToolCatalog:
+    response = await session.list_tools()
+    return ToolCatalog(
+        [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "input_schema": tool.inputSchema,
+            }
+            for tool in response.tools
+        ],
+        {
+            tool.name: tool.annotations.model_dump(exclude_none=True)
+            for tool in response.tools
+            if tool.annotations is not None
+        },
+    )
+
 
 class MCPClient:
-    def __init__(self):
+    def __init__(self, server_pool=None):
         # Initialize session and client objects
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
+        self._tool_catalog: Optional[ToolCatalog] = None
+        # Optional MCPServerPool the session is checked out from instead of spawning a server
+        self.server_pool = server_pool
+        self._pooled_session = None
 
-    async def connect_to_server(self, server_script_path: str):
+    async def _handle_message(self, message):
+        # The cached catalog is only dropped when the server says its tools changed
+        if is_tool_list_changed(message):
+            self._tool_catalog = None
+
+    async def tool_catalog(self) -> ToolCatalog:
+        if self._pooled_session is not None:
+            return await self._pooled_session.tool_catalog()
+        if self._tool_catalog is None:
+            self._tool_catalog = await fetch_tool_catalog(self.session)
+        return self._tool_catalog
+
+    async def connect_to_server(self, server_script_path: str, server_args: list[str] = []):
         """Connect to an MCP server
 
         Args:
             server_script_path: Path to the server script (.py or .js)
+            server_args: Command line arguments given to the server script
         """
-        
-        server_params = StdioServerParameters(
-            command="python",
-            args=[server_script_path],
-            env=os.environ
-        )
+        if self.server_pool is not None:
+            self._pooled_session = await self.server_pool.acquire(server_script_path, server_args)
+            self.session = self._pooled_session.session
+            return
+
+        server_params = server_parameters(server_script_path, server_args)
 
         stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
         self.stdio, self.write = stdio_transport
-        self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
+        self.session = await self.exit_stack.enter_async_context(
+            ClientSession(self.stdio, self.write, message_handler=self._handle_message)
+        )
 
         await self.session.initialize()
 
         # List available tools
-        response = await self.session.list_tools()
-        tools = response.tools
-        print("\nConnected to server with tools:", [tool.name for tool in tools])
+        self._tool_catalog = None
+        tool_catalog = await self.tool_catalog()
+        print("\nConnected to server with tools:", [tool["name"] for tool in tool_catalog.tools])
     
+    async def connect_in_process(self, server_module: str, server_args: list[str] = []):
+        """Mount a Python (Fast)MCP server in this process and connect to it through memory streams
+
+        Args:
+            server_module: Module defining the server as `mcp` (and optionally `configure(argv)`)
+            server_args: Command line arguments the server would have been started with
+        """
+        module = importlib.import_module(server_module)
+        if hasattr(module, "configure"):
+            module.configure(server_args)
+        self.session = await self.exit_stack.enter_async_context(
+            create_connected_server_and_client_session(
+                module.mcp._mcp_server, message_handler=self._handle_message
+            )
+        )
+        self._tool_catalog = None
+
     async def cleanup(self):
         """Clean up resources"""
+        if self._pooled_session is not None:
+            await self.server_pool.release(self._pooled_session)
+            self._pooled_session = None
+            self.session = None
+            return
         await self.exit_stack.aclose()
@@ -0,0 +1,221 @@
+import asyncio
+
+from typing import Optional
+from loguru import logger
+from mcp import ClientSession
+from mcp.client.stdio import stdio_client
+
+from aes_agent.mcp.client import (
+    ToolCatalog,
+    fetch_tool_catalog,
+    is_tool_list_changed,
+    server_parameters,
+)
+from aes_agent.tracing import span
+
+ServerKey = tuple[str, tuple[str, ...]]
+
+
+class PooledSession:
+    """
+    An initialized session with a server subprocess, kept alive between runs.
+
+    The transport and session contexts are entered and exited by a background task
+    that owns them, so that any task can check the session out and return it.
+    """
+
+    def __init__(self, key: ServerKey):
+        self.key = key
+        self.session: Optional[ClientSession] = None
+        self._tool_catalog: Optional[ToolCatalog] = None
+        self._ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _handle_message(self, message):
+        if is_tool_list_changed(message):
+            self._tool_catalog = None
+
+    async def _serve(self):
+        server_script_path, server_args = self.key
+        try:
+            async with stdio_client(server_parameters(server_script_path, list(server_args))) as (
+                read,
+                write,
+            ):
+                async with ClientSession(read, write, message_handler=self._handle_message) as session:
+                    await session.initialize()
+                    self._ready.set_result(session)
+                    await self._closing.wait()
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            else:
+                logger.warning(f"MCP server {server_script_path} stopped: {e}")
+
+    async def start(self):
+        with span("mcp.server_start", server=self.key[0], pooled=True):
+            self._task = asyncio.create_task(self._serve())
+            self.session = await self._ready
+            self._tool_catalog = await fetch_tool_catalog(self.session)
+
+    async def tool_catalog(self) -> ToolCatalog:
+        if self._tool_catalog is None:
+            self._tool_catalog = await fetch_tool_catalog(self.session)
+        return self._tool_catalog
+
+    async def is_healthy(self, timeout: float) -> bool:
+        if self._task is None or self._task.done():
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        self._closing.set()
+        if self._task is not None:
+            await self._task
+
+
+class MCPServerPool:
+    """
+    Warm, pre-initialized MCP server sessions, keyed by server script and arguments.
+
+    Agents check a session out for a run and return it afterwards, instead of
+    spawning (and importing, and initializing) a new server for every run.
+    Sessions are pinged before being handed out, dead ones are replaced in the
+    background, and at most `max_size` sessions exist per key.
+    """
+
+    def __init__(self, max_size: int = 8, health_check_timeout: float = 5):
+        self.max_size = max_size
+        self.health_check_timeout = health_check_timeout
+        self._idle: dict[ServerKey, list[PooledSession]] = {}
+        self._sizes: dict[ServerKey, int] = {}
+        self._released = asyncio.Condition()
+        self._background_tasks: set[asyncio.Task] = set()
+        self._closed = False
+
+    async def _spawn(self, key: ServerKey) -> PooledSession:
+        """Starts a session, the caller must have reserved its slot in `_sizes`"""
+        pooled_session = PooledSession(key)
+        try:
+            await pooled_session.start()
+        except BaseException:
+            try:
+                # The server may be running already if it failed after initializing
+                await pooled_session.close()
+            except Exception:
+                pass
+            finally:
+                await self._free_slot(key)
+            raise
+        return pooled_session
+
+    async def _free_slot(self, key: ServerKey):
+        # Waiters may now spawn their own session
+        async with self._released:
+            self._sizes[key] -= 1
+            self._released.notify_all()
+
+    async def _spawn_idle(self, key: ServerKey):
+        try:
+            pooled_session = await self._spawn(key)
+        except Exception as e:
+            logger.error(f"Couldn't start MCP server {key[0]}: {e}")
+            return
+        async with self._released:
+            self._idle.setdefault(key, []).append(pooled_session)
+            self._released.notify_all()
+
+    def _spawn_in_background(self, key: ServerKey):
+        """Starts an idle session, the caller must have reserved its slot in `_sizes`"""
+        task = asyncio.create_task(self._spawn_idle(key))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _discard(self, pooled_session: PooledSession, replace: bool):
+        """
+        Closes a session. With `replace`, its slot is kept for the replacement started in the
+        background, so that waiters can't take it in between and exceed `max_size`.
+        """
+        key = pooled_session.key
+        if not replace:
+            await self._free_slot(key)
+        try:
+            await pooled_session.close()
+        except Exception as e:
+            logger.warning(f"Couldn't close MCP server {key[0]}: {e}")
+        if replace:
+            if self._closed:
+                await self._free_slot(key)
+            else:
+                self._spawn_in_background(key)
+
+    async def prewarm(self, server_script_path: str, server_args: list[str] = [], count: int = 1):
+        """
+        Starts `count` sessions (without exceeding `max_size`). The first one starts alone, so
+        that the work servers do when they start (e.g. extracting the files into the page store)
+        is done once, then the others start in parallel.
+        """
+        key = (server_script_path, tuple(server_args))
+        count = max(0, min(count, self.max_size - self._sizes.get(key, 0)))
+        if count:
+            self._sizes[key] = self._sizes.get(key, 0) + count
+            await self._spawn_idle(key)
+            await asyncio.gather(*[self._spawn_idle(key) for _ in range(count - 1)])
+        logger.info(f"{len(self._idle.get(key, []))} warm sessions for {server_script_path}")
+
+    async def acquire(self, server_script_path: str, server_args: list[str] = []) -> PooledSession:
+        key = (server_script_path, tuple(server_args))
+        while True:
+            async with self._released:
+                while not self._idle.get(key) and self._sizes.get(key, 0) >= self.max_size:
+                    await self._released.wait()
+                if self._idle.get(key):
+                    pooled_session = self._idle[key].pop()
+                else:
+                    pooled_session = None
+                    self._sizes[key] = self._sizes.get(key, 0) + 1
+
+            if pooled_session is None:
+                return await self._spawn(key)
+            try:
+                healthy = await pooled_session.is_healthy(self.health_check_timeout)
+            except BaseException:
+                # Cancelled during the check, the session goes back to the pool with its slot
+                await asyncio.shield(self.release(pooled_session))
+                raise
+            if healthy:
+                return pooled_session
+            logger.warning(f"Discarding unresponsive MCP server {server_script_path}")
+            await self._discard(pooled_session, replace=True)
+
+    async def release(self, pooled_session: PooledSession):
+        if self._closed:
+            await self._discard(pooled_session, replace=False)
+            return
+        async with self._released:
+            self._idle.setdefault(pooled_session.key, []).append(pooled_session)
+            self._released.notify_all()
+
+    @property
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            key[0]: {"sessions": size, "idle": len(self._idle.get(key, []))}
+            for key, size in self._sizes.items()
+        }
+
+    async def close(self):
+        self._closed = True
+        for task in list(self._background_tasks):
+            await task
+        idle_sessions = [
+            pooled_session for sessions in self._idle.values() for pooled_session in sessions
+        ]
+        self._idle = {}
+        await asyncio.gather(
+            *[self._discard(pooled_session, replace=False) for pooled_session in idle_sessions]
+        )
@@ -1,100 +1,104 @@
 # basic import
 from mcp.server.fastmcp import FastMCP
+from mcp.types import ToolAnnotations
 from typing import Any
 import math
 
 # instantiate an MCP server client
 mcp = FastMCP("Hello World")
 
+# results only depend on the arguments, the agent can reuse them (see aes_agent/memoization.py)
+DETERMINISTIC = ToolAnnotations(readOnlyHint=True, idempotentHint=True)
+
 # DEFINE TOOLS
 
 
 # addition tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def add(a: int, b: int) -> int:
     """Add two numbers"""
     return int(a + b)
 
 
 # subtraction tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def subtract(a: int, b: int = 3) -> int:
     """Subtract two numbers"""
     return int(a - b)
 
 
 # multiplication tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def multiply(a: int, b: int) -> int:
     """Multiply two numbers"""
     return int(a * b)
 
 
 #  division tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def divide(a: int, b: int) -> float:
     """Divide two numbers"""
     return float(a / b)
 
 
 # power tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def power(a: int, b: int) -> int:
     """Power of two numbers"""
     return int(a**b)
 
 
 # square root tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def sqrt(a: int) -> float:
     """Square root of a number"""
     return float(a**0.5)
 
 
 # cube root tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def cbrt(a: int) -> float:
     """Cube root of a number"""
     return float(a ** (1 / 3))
 
 
 # factorial tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def factorial(a: int) -> int:
     """factorial of a number"""
     return int(math.factorial(a))
 
 
 # log tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def log(a: int) -> float:
     """log of a number"""
     return float(math.log(a))
 
 
 # remainder tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def remainder(a: int, b: int) -> int:
     """remainder of two numbers divison"""
     return int(a % b)
 
 
 # sin tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def sin(a: int) -> float:
     """sin of a number"""
     return float(math.sin(a))
 
 
 # cos tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def cos(a: int) -> float:
     """cos of a number"""
     return float(math.cos(a))
 
 
 # tan tool
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 def tan(a: int) -> float:
     """tan of a number"""
     return float(math.tan(a))
@@ -0,0 +1,53 @@
+# basic import
+from fastmcp import FastMCP
+from typing import Any
+from argparse import ArgumentParser
+import asyncio
+import sys
+
+from aes_agent.simulation import LatencyDistribution
+
+# instantiate an MCP server client
+mcp = FastMCP("Latency Server")
+
+# latency of each tool call and size (in characters) of its result, set by `setup`
+tool_latency = LatencyDistribution(0.2, 0.5)
+payload_size = 4000
+
+
+def setup(latency_median: float, latency_sigma: float, payload: int):
+    global tool_latency, payload_size
+    tool_latency = LatencyDistribution(latency_median, latency_sigma)
+    payload_size = payload
+
+
+# DEFINE TOOLS
+
+@mcp.tool()
+async def fetch_document(document_id: str) -> str:
+    """Returns the content of a document (simulated: takes a while and returns filler text)."""
+    await asyncio.sleep(tool_latency.sample())
+    header = f"Content of {document_id}: "
+    return header + "lorem ipsum " * max(0, (payload_size - len(header)) // 12)
+
+
+@mcp.tool()
+def final_answer(answer: Any) -> str:
+    """provides the user with your final answer, ends the conversation."""
+    return str(answer)
+
+
+def configure(argv: list[str]):
+    """Configures the server from its command line arguments (also used when mounted in-process)"""
+    parser = ArgumentParser()
+    parser.add_argument("--latency-median", type=float, default=tool_latency.median)
+    parser.add_argument("--latency-sigma", type=float, default=tool_latency.sigma)
+    parser.add_argument("--payload-size", type=int, default=payload_size)
+    args = parser.parse_args(argv)
+    setup(args.latency_median, args.latency_sigma, args.payload_size)
+
+
+# execute and return the stdio output
+if __name__ == "__main__":
+    configure(sys.argv[1:])
+    mcp.run(transport="stdio")
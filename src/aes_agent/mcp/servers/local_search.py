@@ -1,15 +1,195 @@
 # basic import
 from fastmcp import FastMCP, Context
-from typing import Any
+from mcp.types import ToolAnnotations
+from typing import Any, Optional
+from argparse import ArgumentParser
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from loguru import logger
+import asyncio
 import math
+import os
+import re
+import sys
+
+from aes_agent.documents import DocumentPool, PageStore, StoredDocument
+from aes_agent.search_index import SearchIndex
+from aes_agent.warmup import log_progress, warm_up
+
+# extracted text of the PDFs, shared by every tool and persisted across runs
+page_store = PageStore()
+# open PyMuPDF handles, used whenever a page isn't in the store yet
+document_pool = DocumentPool()
+# BM25 indexes built by `setup`, one per set of available files (servers mounted
+# in-process with different files share this module)
+search_indexes: dict[tuple[str, ...], SearchIndex] = {}
+# available files of the server handling the request, and processes extracting them before a
+# standalone server starts (0: extracted by `lifespan` on the event loop): set by `setup`
+# before the server starts, its tasks inherit the values
+server_files: ContextVar[Optional[tuple[str, ...]]] = ContextVar("server_files", default=None)
+server_warmup_workers: ContextVar[Optional[int]] = ContextVar("server_warmup_workers", default=None)
+# results only depend on the arguments, the agent can reuse them (see aes_agent/memoization.py)
+DETERMINISTIC = ToolAnnotations(readOnlyHint=True, idempotentHint=True)
+# documents being extracted into the page store in the background (absolute path -> task)
+pending_stores: dict[str, asyncio.Task] = {}
+# bounds of a multi-page read (read_pages, page:// windows like "3-8")
+MAX_PAGES_PER_READ = 20
+DEFAULT_MAX_CHARS = 20000
+PAGE_WINDOW = re.compile(r"^(\d+)-(\d+)$")
+
+
+def load_document(file_path: str) -> StoredDocument:
+    document = page_store.lookup(file_path)
+    if document is None:
+        document = page_store.store(file_path, document_pool.pages_text(file_path))
+    return document
+
+
+async def store_document(file_path: str):
+    """Extracts a document into the page store a page at a time, letting other requests run in between"""
+    pages = []
+    for page_number in range(document_pool.get(file_path).page_count):
+        pages.append(document_pool.page_text(file_path, page_number) or "")
+        await asyncio.sleep(0)
+    page_store.store(file_path, pages)
+
+
+def store_in_background(file_path: str):
+    """
+    Starts storing a document that was read before being extracted, so that its next reads
+    come from the page store (the document pool serves them in the meantime). Without an
+    event loop, the document is stored right away.
+    """
+    absolute_path = os.path.abspath(file_path)
+    if absolute_path in pending_stores:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        load_document(file_path)
+        return
+
+    def stored(task: asyncio.Task):
+        del pending_stores[absolute_path]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Couldn't store {file_path}: {task.exception()!r}")
+
+    pending_stores[absolute_path] = loop.create_task(store_document(file_path))
+    pending_stores[absolute_path].add_done_callback(stored)
+
+
+def page_count(file_path: str) -> int:
+    document = page_store.lookup(file_path)
+    if document is not None:
+        return document.page_count
+    return document_pool.get(file_path).page_count
+
+
+def page_text(file_path: str, page_number: int) -> Optional[str]:
+    """Text of a page from the store, or extracted on its own while the file is being stored"""
+    document = page_store.lookup(file_path)
+    if document is not None:
+        if 0 <= page_number < document.page_count:
+            return document.page(page_number)
+        return None
+
+    text = document_pool.page_text(file_path, page_number)
+    logger.debug(f"Document pool: {document_pool.stats}")
+    store_in_background(file_path)
+    return text
+
+
+def read_page_window(file_path: str, start: int, end: int, max_chars: int = DEFAULT_MAX_CHARS) -> str:
+    """
+    Pages `start` to `end` (included) of a file, each one between <page n> tags. At most
+    MAX_PAGES_PER_READ pages and `max_chars` characters (tags included) are returned, the
+    last tag says where to continue from when the window is cut short, or where the
+    document ends when the window goes past it.
+    """
+    if max_chars < 1:
+        return "max_chars must be at least 1."
+    last_page = page_count(file_path) - 1
+    if not 0 <= start <= last_page or end < start:
+        return f"Couldn't find content from said pages (pages go from 0 to {last_page})."
+    requested_end, end = end, min(end, last_page, start + MAX_PAGES_PER_READ - 1)
+
+    if end < min(requested_end, last_page):
+        note = (
+            f"<truncated>At most {MAX_PAGES_PER_READ} pages are read at once, "
+            f"continue from page {end + 1}.</truncated>"
+        )
+    elif end < requested_end:
+        note = f"<end>The document ends at page {last_page}.</end>"
+    else:
+        note = ""
+    window = []
+    length = 0  # of the pages in the window, each with its tags and line break
+    for page_number in range(start, end + 1):
+        text = page_text(file_path, page_number) or ""
+        opening, closing = f"<page {page_number}>\n", f"\n</page {page_number}>"
+        tags_length = len(opening) + len(closing) + 1
+        if length + tags_length + len(text) + len(note) > max_chars:
+            note = (
+                f"<truncated>The {max_chars} characters limit was reached in page {page_number}, "
+                f"pages {page_number} to {end} weren't fully read.</truncated>"
+            )
+            kept = max(0, max_chars - length - tags_length - len(note))
+            window.append(f"{opening}{text[:kept]}{closing}")
+            break
+        window.append(f"{opening}{text}{closing}")
+        length += tags_length + len(text)
+    if note:
+        window.append(note)
+    return "\n".join(window)
+
+
+async def prepare_files(files: tuple[str, ...]):
+    """
+    Extracts the available files that aren't in the page store yet, on the event loop a page
+    at a time, then indexes them in a thread (incrementally, if an index was saved by a
+    previous run), so that servers mounted in-process don't block the event loop.
+    """
+    missing = [
+        file_path
+        for file_path in dict.fromkeys(files)
+        if os.path.isfile(file_path) and page_store.lookup(file_path) is None
+    ]
+    for i, file_path in enumerate(missing):
+        store_in_background(file_path)
+        storing = pending_stores.get(os.path.abspath(file_path))
+        if storing is not None:
+            try:
+                await storing
+            except Exception:
+                pass  # logged when the task finished
+        log_progress(i + 1, len(missing), file_path)
+    if files not in search_indexes:
+        search_index = await asyncio.to_thread(SearchIndex, list(files), load_document)
+        search_indexes.setdefault(files, search_index)
+    search_index = search_indexes[files]
+    if await asyncio.to_thread(search_index.refresh):
+        logger.info(f"Indexed {len(files)} files into {search_index.path}")
+
+
+def setup(available_files: list[str], warmup_workers: Optional[int] = None):
+    """Sets the available files of the server, prepared by `lifespan` when it starts"""
+    server_files.set(tuple(available_files))
+    server_warmup_workers.set(warmup_workers)
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    await prepare_files(server_files.get() or ())
+    yield
+
 
 # instantiate an MCP server client
-mcp = FastMCP("LocalSearch Server")
+mcp = FastMCP("LocalSearch Server", lifespan=lifespan)
+
 
 # DEFINE TOOLS
 
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 async def number_of_words(pdf_path: str, ctx: Context) -> str:
     """Returns to the user the number of words contained inside a PDF document"""
     await ctx.info(f"Processing {pdf_path}...")
@@ -23,13 +203,32 @@ async def number_of_words(pdf_path: str, ctx: Context) -> str:
 #     data = await ctx.read_resource(f"pdf://{pdf_path}")
 #     return data[0].content
 
-@mcp.tool()
+@mcp.tool(annotations=DETERMINISTIC)
 async def read_specific_page(pdf_path: str, pdf_page:int, ctx: Context) -> str:
     """Returns to the user the content of a specific page in a PDF file."""
     await ctx.info(f"Processing {pdf_path}...")
     data = await ctx.read_resource(f"page://{pdf_path}/{pdf_page}")
     return data[0].content
 
+@mcp.tool(annotations=DETERMINISTIC)
+def read_pages(pdf_path: str, start: int, end: int, max_chars: int = DEFAULT_MAX_CHARS) -> str:
+    """Returns to the user the content of pages start to end (included, at most 20 pages) of a PDF file, each page between <page n> tags."""
+    return read_page_window(pdf_path, start, end, max_chars)
+
+@mcp.tool(annotations=DETERMINISTIC)
+def search_documents(query: str, top_k: int = 5) -> str:
+    """Searches the available PDF files and returns the most relevant pages (file, page number and snippet)."""
+    search_index = search_indexes.get(server_files.get())
+    if search_index is None:
+        return "No documents were indexed."
+    hits = search_index.search(query, top_k)
+    if not hits:
+        return f"No page matches '{query}'."
+    search_results_string = ""
+    for hit in hits:
+        search_results_string += f"- {hit['file']} (page {hit['page']}, score {hit['score']:.2f}): {hit['snippet']}\n"
+    return search_results_string
+
 @mcp.tool()
 def final_answer(answer: Any) -> str:
     """provides the user with your final answer, ends the conversation."""
@@ -40,33 +239,23 @@ def final_answer(answer: Any) -> str:
 # Dynamic resource template
 @mcp.resource("pdf://{file_path*}")
 def read_pdf(file_path: str):
-    import fitz
-    texte_complet = ""
-    doc = fitz.open(file_path)
-
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        texte_page = page.get_text("text") # ou simplement page.get_text()
-        texte_complet += texte_page + "\n" # Ajouter un saut de ligne entre les pages
-
-    doc.close()
-    return texte_complet
+    return load_document(file_path).text()
 
-# Dynamic resource template
+# Dynamic resource template: a page ("3") or a window of pages ("3-8")
 @mcp.resource("page://{file_path*}/{requested_page}")
-def read_pdf_page(file_path: str, requested_page: int):
-    import fitz
-    texte_complet = ""
-    doc = fitz.open(file_path)
-
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        texte_page = page.get_text("text") # ou simplement page.get_text()
-        if page_num == requested_page:
-            doc.close()
-            return texte_page
-    doc.close()
-    return "Couldn't find content from said page."
+def read_pdf_page(file_path: str, requested_page: str):
+    window = PAGE_WINDOW.match(str(requested_page))
+    if window is not None:
+        return read_page_window(file_path, int(window.group(1)), int(window.group(2)))
+
+    try:
+        page_number = int(requested_page)
+    except ValueError:
+        return "Couldn't find content from said page."
+    text = page_text(file_path, page_number)
+    if text is None:
+        return "Couldn't find content from said page."
+    return text
 
 # Add a dynamic greeting resource
 @mcp.resource("greeting://{name}")
@@ -75,6 +264,19 @@ def get_greeting(name: str) -> str:
     return f"Hello, {name}!"
 
 
+def configure(argv: list[str]):
+    """Configures the server from its command line arguments (also used when mounted in-process)"""
+    parser = ArgumentParser()
+    parser.add_argument("--available-files", nargs="*", default=[])
+    parser.add_argument("--warmup-workers", type=int, default=None, help="0 to extract files on the event loop")
+    args = parser.parse_args(argv)
+    setup(args.available_files, args.warmup_workers)
+
+
 # execute and return the stdio output
 if __name__ == "__main__":
+    configure(sys.argv[1:])
+    # A standalone server owns its process: its files are extracted in parallel before it starts
+    if server_warmup_workers.get() != 0:
+        warm_up(list(server_files.get()), page_store, server_warmup_workers.get())
     mcp.run(transport="stdio")
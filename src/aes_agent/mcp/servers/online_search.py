@@ -1,134 +1,156 @@
 import math
 import os
-import requests
 import sys
+import time
 import asyncio
+import httpx
 
 from fastmcp import FastMCP, Context
+from mcp.types import ToolAnnotations
 from loguru import logger
 from typing import TypedDict, Optional, Any
-from playwright.async_api import async_playwright, Playwright
+from contextlib import asynccontextmanager
+from argparse import ArgumentParser
 from inscriptis import get_text
 
-class SearchResult(TypedDict):
-    title: str
-    url: str
-    contains_file: bool
+from aes_agent.browser_pool import BrowserPool
+from aes_agent.cache import PersistentCache, normalize_query, normalize_url
+from aes_agent.search_client import BraveSearchClient
+from aes_agent.utils import cache_dir
 
 
-logger.remove()
-logger.level("SEARCH", no=15, color="<blue>", icon="🧐")
-logger.add(
-    sys.stderr,
-    format="<green>{time:HH:mm:ss}</green> | <level>{level.icon} {level.name: <8}</level> | <level>{message}</level>",
-)
-
 
 BRAVE_API_KEY = os.environ["BRAVE_API_KEY"]
 
+# long-lived browsers shared by every read_url call
+browser_pool: Optional[BrowserPool] = None
+# keep-alive connections to the search API shared by every web_search call
+search_client: Optional[BraveSearchClient] = None
+# search results and page contents, kept across turns and runs (TTLs can be set with `setup`)
+web_cache: Optional[PersistentCache] = None
+search_cache_ttl = 24 * 3600
+page_cache_ttl = 3600
+cache_memory_entries = 256
+# conditional requests used to revalidate expired pages
+revalidation_client: Optional[httpx.AsyncClient] = None
+# servers using the browsers, clients and cache above: a stdio server, or any number of servers
+# mounted in-process, which share this module. They are opened by the first one to
+# start and closed when the last one stops.
+running_servers = 0
+
+
+def setup(search_ttl: float, page_ttl: float, max_memory_entries: int):
+    global search_cache_ttl, page_cache_ttl, cache_memory_entries
+    search_cache_ttl = search_ttl
+    page_cache_ttl = page_ttl
+    cache_memory_entries = max_memory_entries
+    if web_cache is not None:
+        web_cache.max_memory_entries = max_memory_entries
+
 
 async def fetch_website_data(
-    playwright: Playwright, url: str
-) -> tuple[str | None, str | None, str | None]:
+    url: str,
+) -> tuple[str | None, str | None, str | None, dict]:
     """
-    Se connecte à une URL donnée avec Playwright et retourne le titre et le contenu HTML de la page.
+    Se connecte à une URL donnée avec une page du pool de navigateurs et retourne le titre et le contenu HTML de la page.
 
     Args:
         url: L'URL du site web à visiter.
 
     Returns:
-        Un tuple contenant le titre de la page et son contenu HTML.
-        Retourne (None, None) si une erreur survient.
+        Un tuple contenant le titre de la page, son contenu HTML, son texte et ses
+        validateurs de cache HTTP (ETag / Last-Modified).
+        Retourne (None, None, None, {}) si une erreur survient.
     """
-    chromium = playwright.chromium
-    browser = await chromium.launch()
-    page = await browser.new_page()
     try:
-        print(f"Connexion à {url}...")
-        # Effectue la requête GET sur l'URL
-        # Augmentation du timeout par défaut si nécessaire pour les pages lentes
-        await page.goto(url, timeout=60000)  # Timeout de 60 secondes
-
-        # Récupère le titre de la page
-        title = await page.title()
-        print(f"Le titre de la page est : '{title}'")
-
-        # Récupère le contenu HTML complet de la page
-        content = await page.content()
-        # print(f"Contenu de la page :\n{content[:500]}...") # Affiche les 500 premiers caractères
+        async with browser_pool.page() as page:
+            logger.info(f"Connexion à {url}...")
+            # Un navigateur bloqué ne doit pas bloquer le serveur : la page est alors recyclée
+            async with asyncio.timeout(90):
+                # Augmentation du timeout par défaut si nécessaire pour les pages lentes
+                response = await page.goto(url, timeout=60000)  # Timeout de 60 secondes
+                validators = {}
+                if response is not None:
+                    for header in ["etag", "last-modified"]:
+                        if header in response.headers:
+                            validators[header] = response.headers[header]
+
+                # Récupère le titre de la page
+                title = await page.title()
+                logger.info(f"Le titre de la page est : '{title}'")
+
+                # Récupère le contenu HTML complet de la page
+                content = await page.content()
 
         text = get_text(content)
-        return title, content, text
+        return title, content, text, validators
     except Exception as e:
-        print(f"Une erreur est survenue lors de la connexion à {url}: {e}")
-        return None, None, None
+        logger.error(f"Une erreur est survenue lors de la connexion à {url}: {e}")
+        return None, None, None, {}
+
+
+async def revalidate(url: str, validators: dict) -> bool:
+    """Asks the website whether a cached page is still current (HTTP 304), without rendering it."""
+    headers = {}
+    if "etag" in validators:
+        headers["If-None-Match"] = validators["etag"]
+    if "last-modified" in validators:
+        headers["If-Modified-Since"] = validators["last-modified"]
+    if not headers:
+        return False
+    try:
+        response = await revalidation_client.get(url, headers=headers)
+    except httpx.HTTPError as e:
+        logger.warning(f"Couldn't revalidate {url}: {e}")
+        return False
+    return response.status_code == 304
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    global running_servers, browser_pool, search_client, web_cache, revalidation_client
+    if running_servers == 0:
+        browser_pool = BrowserPool()
+        search_client = BraveSearchClient(BRAVE_API_KEY)
+        web_cache = PersistentCache(
+            os.path.join(cache_dir(), "web.sqlite"), max_memory_entries=cache_memory_entries
+        )
+        revalidation_client = httpx.AsyncClient(timeout=10, follow_redirects=True)
+    running_servers += 1
+    try:
+        yield
     finally:
-        # Ferme le navigateur
-        await browser.close()
-
-
-def search(
-    question: str,
-    country: Optional[str] = None,
-    search_lang: Optional[str] = None,
-    time_range: Optional[tuple[str, str]] = None,
-    pdf: bool = False,
-    website: Optional[str] = None,
-) -> list[SearchResult]:
-    question_uri_format = question.replace(" ", "+").lower()
-    time_range_parameter = ""
-    if time_range:
-        if type(time_range) != tuple:
-            raise Exception("time_range format should be a tuple of strings")
-        time_range_parameter = f"?freshness={time_range[0]}to{time_range[1]}"
-
-    operators = []
-    if pdf:
-        operators.append("filetype:pdf")
-    if website:
-        operators.append(f"site:{website}")
-    full_search = question + " AND ".join(operators)
-
-    country_parameter = ""
-    if country:
-        country_parameter = f"?country={country_parameter.upper()}"
-
-    search_lang_parameter = ""
-    if search_lang:
-        search_lang_parameter = f"?search_lang={search_lang.lower()}"
-
-    url = f"https://api.search.brave.com/res/v1/web/search?q={full_search}{country_parameter}{search_lang_parameter}"
-    headers = {
-        "Accept": "application/json",
-        "Accept-Encoding": "gzip",  # requests handles gzip decompression automatically
-        "X-Subscription-Token": BRAVE_API_KEY,
-    }
-
-    logger.log("SEARCH", f"Searching for {url}")
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    json_response = response.json()
-    search_results: list[SearchResult] = []
-    if "web" not in json_response:
-        return []
-    for result in json_response["web"]["results"]:
-        search_result: SearchResult = {
-            "title": result["title"],
-            "url": result["url"],
-            "contains_file": True if ".pdf" in result["url"] else False,
-        }
-        search_results.append(search_result)
-    return search_results
+        running_servers -= 1
+        if running_servers == 0:
+            # A server starting while these close gets new ones
+            closing_browsers, closing_search, closing_cache, closing_revalidation = (
+                browser_pool, search_client, web_cache, revalidation_client
+            )
+            browser_pool = search_client = web_cache = revalidation_client = None
+            await closing_browsers.close()
+            await closing_search.aclose()
+            await closing_revalidation.aclose()
+            logger.info(f"Web cache: {closing_cache.stats}")
+            closing_cache.close()
 
 
 # instantiate an MCP server client
-mcp = FastMCP("OnlineSearch Server")
+mcp = FastMCP("OnlineSearch Server", lifespan=lifespan)
 
+# the web changes, the agent only reuses results for a few minutes (see aes_agent/memoization.py)
+WEB_READ = ToolAnnotations(readOnlyHint=True, idempotentHint=True, openWorldHint=True, cacheTtl=600)
 
-@mcp.tool()
-def web_search(search_question: str) -> str:
+
+@mcp.tool(annotations=WEB_READ)
+async def web_search(search_question: str) -> str:
     """Performs a web search and results a list of potentially relevant titles & urls."""
-    search_results = search(search_question)
+    cache_key = f"search:{normalize_query(search_question)}"
+    cached = web_cache.get(cache_key)
+    if cached is not None:
+        search_results = cached["value"]
+    else:
+        search_results = await search_client.search(search_question)
+        web_cache.set(cache_key, search_results, search_cache_ttl)
     search_results_string = ""
     for search_result in search_results:
         if search_result["contains_file"]:
@@ -137,12 +159,26 @@ def web_search(search_question: str) -> str:
     return search_results_string
 
 
-@mcp.tool()
+@mcp.tool(annotations=WEB_READ)
 async def read_url(url: str) -> str:
     """Reads the content of a webpage url"""
-    async with async_playwright() as playwright:
-        title, html_content, text_content = await fetch_website_data(playwright, url)
-    return f"{title}\n===\n{text_content}"
+    cache_key = f"page:{normalize_url(url)}"
+    cached = web_cache.get(cache_key, allow_stale=True)
+    if cached is not None:
+        if cached["expires_at"] >= time.time():
+            return cached["value"]
+        if await revalidate(url, cached["metadata"]):
+            logger.info(f"{url} hasn't changed since it was cached")
+            web_cache.touch(cache_key, page_cache_ttl)
+            return cached["value"]
+
+    title, html_content, text_content, validators = await fetch_website_data(url)
+    if title is None:
+        # An error result, that neither the cache nor the agent's memo keep
+        raise Exception(f"Couldn't read {url}")
+    page_string = f"{title}\n===\n{text_content}"
+    web_cache.set(cache_key, page_string, page_cache_ttl, validators)
+    return page_string
 
 
 @mcp.tool()
@@ -151,6 +187,23 @@ def final_answer(answer: Any) -> str:
     return str(answer)
 
 
+def configure(argv: list[str]):
+    """Configures the server from its command line arguments (also used when mounted in-process)"""
+    parser = ArgumentParser()
+    parser.add_argument("--search-cache-ttl", type=float, default=search_cache_ttl)
+    parser.add_argument("--page-cache-ttl", type=float, default=page_cache_ttl)
+    parser.add_argument("--cache-memory-entries", type=int, default=cache_memory_entries)
+    args = parser.parse_args(argv)
+    setup(args.search_cache_ttl, args.page_cache_ttl, args.cache_memory_entries)
+
+
 # execute and return the stdio output
 if __name__ == "__main__":
+    # Only a standalone server owns the process' logging configuration
+    logger.remove()
+    logger.add(
+        sys.stderr,
+        format="<green>{time:HH:mm:ss}</green> | <level>{level.icon} {level.name: <8}</level> | <level>{message}</level>",
+    )
+    configure(sys.argv[1:])
     mcp.run(transport="stdio")
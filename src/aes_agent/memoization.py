@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+from typing import Any, Optional
+
+from loguru import logger
+from mcp import types
+
+from aes_agent.mcp.client import ToolCatalog
+from aes_agent.utils import canonical_hash
+
+# Tools with side effects on the run itself, never memoized whatever their annotations
+NEVER_MEMOIZED = {"final_answer"}
+
+
+def memoization_ttl(name: str, tool_catalog: ToolCatalog) -> Optional[float]:
+    """
+    How long (seconds) the results of a tool can be reused, None if they can't.
+
+    A server opts a tool in by annotating it as readOnlyHint and idempotentHint,
+    and optionally gives the lifetime of its results as cacheTtl (otherwise they
+    are reused for the whole run).
+    """
+    annotations = tool_catalog.annotations.get(name, {})
+    if name in NEVER_MEMOIZED or not (
+        annotations.get("readOnlyHint") and annotations.get("idempotentHint")
+    ):
+        return None
+    return float(annotations.get("cacheTtl", float("inf")))
+
+
+class ToolMemo:
+    """
+    Results of the deterministic tool calls of a run, keyed on (server, tool, canonical arguments).
+
+    Identical calls made while the first one is running wait for its result
+    instead of reaching the server. Errors are never memoized.
+    """
+
+    def __init__(self, server: str):
+        self.server = server
+        self.hits = 0
+        self.misses = 0
+        # key -> (result, expiry time)
+        self._results: dict[str, tuple[types.CallToolResult, float]] = {}
+        # key -> call in flight, shared by the identical calls made meanwhile
+        self._pending: dict[str, asyncio.Task] = {}
+
+    def key(self, name: str, arguments: Optional[dict]) -> str:
+        return canonical_hash({"server": self.server, "tool": name, "arguments": arguments or {}})
+
+    async def _call(
+        self, session: Any, key: str, ttl: float, name: str, arguments: Optional[dict]
+    ) -> types.CallToolResult:
+        result = await session.call_tool(name, arguments)
+        if not result.isError:
+            self._results[key] = (result, time.monotonic() + ttl)
+        return result
+
+    def _finished(self, key: str, task: asyncio.Task):
+        del self._pending[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller was cancelled
+
+    async def call_tool(
+        self, session: Any, tool_catalog: ToolCatalog, name: str, arguments: Optional[dict] = None
+    ) -> types.CallToolResult:
+        ttl = memoization_ttl(name, tool_catalog)
+        if ttl is None:
+            return await session.call_tool(name, arguments)
+        key = self.key(name, arguments)
+        memoized = self._results.get(key)
+        if memoized is not None and memoized[1] > time.monotonic():
+            self.hits += 1
+            return memoized[0]
+
+        pending = self._pending.get(key)
+        if pending is None:
+            self.misses += 1
+            # The call runs as its own task: a caller being cancelled doesn't cancel it for the others
+            pending = self._pending[key] = asyncio.create_task(
+                self._call(session, key, ttl, name, arguments)
+            )
+            pending.add_done_callback(lambda task: self._finished(key, task))
+            return await asyncio.shield(pending)
+        result = await asyncio.shield(pending)
+        self.hits += 1
+        return result
+
+    def session(self, session: Any, tool_catalog: ToolCatalog) -> "MemoizedSession":
+        return MemoizedSession(self, session, tool_catalog)
+
+    @property
+    def hit_rate(self) -> float:
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
+
+    def log_stats(self):
+        if self.hits + self.misses:
+            logger.info(
+                f"Tool memoization: {self.hits}/{self.hits + self.misses} calls reused ({self.hit_rate:.0%})"
+            )
+
+
+class MemoizedSession:
+    """Stands for an MCP ClientSession during a turn: tool calls go through the memo"""
+
+    def __init__(self, memo: ToolMemo, session: Any, tool_catalog: ToolCatalog):
+        self.memo = memo
+        self.session = session
+        self.tool_catalog = tool_catalog
+
+    async def call_tool(self, name: str, arguments: Optional[dict] = None) -> types.CallToolResult:
+        return await self.memo.call_tool(self.session, self.tool_catalog, name, arguments)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
@@ -0,0 +1,142 @@
+import json
+import math
+import os
+
+from aes_agent.utils import Turn
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (10, 100, 500, 1000, 5000, 10000, 25000, 50000, 100000, 200000)
+SIZE_BUCKETS = (100, 1000, 10000, 50000, 100000, 500000, 1000000)
+
+
+def _format_labels(labels: dict[str, str], **extra_labels: str) -> str:
+    labels = {**labels, **extra_labels}
+    if not labels:
+        return ""
+    escaped = {
+        name: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for name, value in labels.items()
+    }
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped.items()) + "}"
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+class Histogram:
+    """Observations of a metric, split in series by their labels"""
+
+    def __init__(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # sorted label items -> observed values (kept for the percentiles of the JSON summary)
+        self.series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, labels: dict[str, str] = {}):
+        self.series.setdefault(tuple(sorted(labels.items())), []).append(value)
+
+    def to_prometheus(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_items, values in self.series.items():
+            labels = dict(label_items)
+            for bucket in self.buckets:
+                count = sum(1 for value in values if value <= bucket)
+                lines.append(f"{self.name}_bucket{_format_labels(labels, le=str(bucket))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels, le='+Inf')} {len(values)}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {sum(values)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {len(values)}")
+        return "\n".join(lines)
+
+    def summary(self) -> dict:
+        series = []
+        for label_items, values in self.series.items():
+            sorted_values = sorted(values)
+            series.append(
+                {
+                    "labels": dict(label_items),
+                    "count": len(values),
+                    "sum": sum(values),
+                    "mean": sum(values) / len(values),
+                    "p50": _percentile(sorted_values, 0.5),
+                    "p95": _percentile(sorted_values, 0.95),
+                    "p99": _percentile(sorted_values, 0.99),
+                    "max": sorted_values[-1],
+                }
+            )
+        return {"help": self.documentation, "series": series}
+
+
+class MetricsRegistry:
+    """
+    Histograms of the timings and sizes recorded by the agent, turn by turn.
+
+    A registry can be shared by several agents (e.g. a batch of runs), and is
+    exported as a Prometheus text file (for node_exporter's textfile collector)
+    and as a JSON summary with percentiles.
+    """
+
+    def __init__(self, prefix: str = "aes_agent"):
+        self.prefix = prefix
+        self.histograms: dict[str, Histogram] = {}
+
+    def histogram(
+        self, name: str, documentation: str = "", buckets: tuple = LATENCY_BUCKETS
+    ) -> Histogram:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(f"{self.prefix}_{name}", documentation, buckets)
+        return self.histograms[name]
+
+    def observe_turn(self, turn: Turn, duration: float):
+        """Records the timings, token usage and tool calls of a turn"""
+        self.histogram("turn_duration_seconds", "Wall time of a whole turn").observe(duration)
+        turn_metrics = turn.get("metrics", {})
+        if "prompt_build_seconds" in turn_metrics:
+            self.histogram(
+                "prompt_build_seconds", "Time spent building the prompt of a turn"
+            ).observe(turn_metrics["prompt_build_seconds"])
+        if "llm_latency_seconds" in turn_metrics:
+            self.histogram(
+                "llm_latency_seconds", "Time from the LLM request to its complete response"
+            ).observe(turn_metrics["llm_latency_seconds"])
+        if "time_to_first_token_seconds" in turn_metrics:
+            self.histogram(
+                "llm_time_to_first_token_seconds", "Time from the LLM request to its first token"
+            ).observe(turn_metrics["time_to_first_token_seconds"])
+        for kind, tokens in turn.get("usage", {}).items():
+            self.histogram(
+                "llm_tokens", "Tokens of an LLM request, by kind", TOKEN_BUCKETS
+            ).observe(tokens, {"kind": kind.removesuffix("_tokens")})
+        for tool_call in turn["tools_called"]:
+            metadata = tool_call["metadata"] or {}
+            labels = {"tool": tool_call["name"]}
+            if "duration_seconds" in metadata:
+                self.histogram(
+                    "tool_call_latency_seconds", "Latency of MCP tool calls, by tool"
+                ).observe(metadata["duration_seconds"], labels)
+            if "result_size" in metadata:
+                self.histogram(
+                    "tool_result_size_bytes", "Size of MCP tool results, by tool", SIZE_BUCKETS
+                ).observe(metadata["result_size"], labels)
+
+    def to_prometheus(self) -> str:
+        return "\n".join(histogram.to_prometheus() for histogram in self.histograms.values()) + "\n"
+
+    def summary(self) -> dict:
+        return {histogram.name: histogram.summary() for histogram in self.histograms.values()}
+
+    def export(self, directory: str, name: str = "metrics") -> tuple[str, str]:
+        """Writes `<name>.prom` and `<name>.json` in `directory`, returns their paths"""
+        os.makedirs(directory, exist_ok=True)
+        prometheus_path = os.path.join(directory, f"{name}.prom")
+        json_path = os.path.join(directory, f"{name}.json")
+        # Written to a temporary file first, so that a collector never reads a partial file
+        for path, content in [
+            (prometheus_path, self.to_prometheus()),
+            (json_path, json.dumps(self.summary(), indent=2)),
+        ]:
+            with open(f"{path}.{os.getpid()}.tmp", "w") as metrics_file:
+                metrics_file.write(content)
+            os.replace(f"{path}.{os.getpid()}.tmp", path)
+        return prometheus_path, json_path
@@ -0,0 +1,92 @@
+import os
+
+import httpx
+
+from loguru import logger
+from typing import Optional, TypedDict
+
+BRAVE_SEARCH_URL = "https://api.search.brave.com/res/v1/web/search"
+
+logger.level("SEARCH", no=15, color="<blue>", icon="🧐")
+
+
+class SearchResult(TypedDict):
+    title: str
+    url: str
+    contains_file: bool
+
+
+class BraveSearchClient:
+    """
+    Async client for the Brave web search API.
+
+    Requests share one pool of keep-alive connections, so concurrent searches
+    don't block the event loop and don't pay a new TLS handshake each.
+    The endpoint can be pointed elsewhere (e.g. a local stub) with BRAVE_SEARCH_URL.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        timeout: float = 10,
+        max_connections: int = 20,
+    ):
+        self.base_url = base_url or os.environ.get("BRAVE_SEARCH_URL", BRAVE_SEARCH_URL)
+        self._client = httpx.AsyncClient(
+            headers={
+                "Accept": "application/json",
+                "Accept-Encoding": "gzip",  # httpx handles gzip decompression automatically
+                "X-Subscription-Token": api_key,
+            },
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def search(
+        self,
+        question: str,
+        country: Optional[str] = None,
+        search_lang: Optional[str] = None,
+        time_range: Optional[tuple[str, str]] = None,
+        pdf: bool = False,
+        website: Optional[str] = None,
+    ) -> list[SearchResult]:
+        operators = []
+        if pdf:
+            operators.append("filetype:pdf")
+        if website:
+            operators.append(f"site:{website}")
+        full_search = " ".join([question, " AND ".join(operators)]).strip()
+
+        params = {"q": full_search}
+        if time_range:
+            if type(time_range) != tuple:
+                raise Exception("time_range format should be a tuple of strings")
+            params["freshness"] = f"{time_range[0]}to{time_range[1]}"
+        if country:
+            params["country"] = country.upper()
+        if search_lang:
+            params["search_lang"] = search_lang.lower()
+
+        logger.log("SEARCH", f"Searching for {params}")
+        response = await self._client.get(self.base_url, params=params)
+        response.raise_for_status()
+        json_response = response.json()
+        search_results: list[SearchResult] = []
+        if "web" not in json_response:
+            return []
+        for result in json_response["web"]["results"]:
+            search_result: SearchResult = {
+                "title": result["title"],
+                "url": result["url"],
+                "contains_file": True if ".pdf" in result["url"] else False,
+            }
+            search_results.append(search_result)
+        return search_results
+
+    async def aclose(self):
+        await self._client.aclose()
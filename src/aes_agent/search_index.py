@@ -0,0 +1,224 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+
+from collections import Counter
+from typing import Callable, Optional, TypedDict
+
+from aes_agent.documents import StoredDocument, file_fingerprint
+from aes_agent.utils import cache_dir
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchHit(TypedDict):
+    file: str
+    page: int
+    score: float
+    snippet: str
+
+
+class SearchIndex:
+    """
+    Page-level inverted index over a set of PDF files, scored with BM25.
+
+    Each file is indexed once per version (see `file_fingerprint`), and the
+    index is saved to disk so that it survives server restarts. Searches check
+    the files for changes at most every `refresh_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        files: list[str],
+        load_document: Callable[[str], StoredDocument],
+        path: Optional[str] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        refresh_interval: float = 10,
+    ):
+        self.files = list(files)
+        self.load_document = load_document
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval = refresh_interval
+        if path is None:
+            absolute_paths = sorted(os.path.abspath(file) for file in self.files)
+            files_key = hashlib.sha1("\0".join(absolute_paths).encode()).hexdigest()
+            path = os.path.join(cache_dir(), "index", f"{files_key}.json")
+        self.path = path
+
+        # file -> fingerprint of the indexed version and ids of its pages
+        self.indexed_files: dict[str, dict] = {}
+        # page id -> (file, page number, length in tokens), None once removed until compacted
+        self.pages: list[Optional[tuple[str, int, int]]] = []
+        # term -> {page id: term frequency}
+        self.postings: dict[str, dict[int, int]] = {}
+        self._total_length = 0
+        self._live_pages = 0
+        self._refreshed_at = float("-inf")
+        # The index can be refreshed in a thread while servers search it
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as index_file:
+            data = json.load(index_file)
+        self.indexed_files = data["indexed_files"]
+        self.pages = [tuple(page) if page else None for page in data["pages"]]
+        self.postings = {
+            term: {int(page_id): tf for page_id, tf in postings.items()}
+            for term, postings in data["postings"].items()
+        }
+        for page in self.pages:
+            if page:
+                self._total_length += page[2]
+                self._live_pages += 1
+        if self._live_pages < len(self.pages):
+            self._compact()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = {
+            "indexed_files": self.indexed_files,
+            "pages": self.pages,
+            "postings": self.postings,
+        }
+        with open(f"{self.path}.{os.getpid()}.tmp", "w") as index_file:
+            json.dump(data, index_file)
+        os.replace(f"{self.path}.{os.getpid()}.tmp", self.path)
+
+    def _remove_file(self, file: str):
+        page_ids = set(self.indexed_files.pop(file)["pages"])
+        for page_id in page_ids:
+            self._total_length -= self.pages[page_id][2]
+            self._live_pages -= 1
+            self.pages[page_id] = None
+        for term in list(self.postings):
+            postings = self.postings[term]
+            for page_id in page_ids.intersection(postings):
+                del postings[page_id]
+            if not postings:
+                del self.postings[term]
+
+    def _compact(self):
+        """Renumbers the pages, dropping the entries of removed ones"""
+        page_ids = {}
+        pages = []
+        for page_id, page in enumerate(self.pages):
+            if page is not None:
+                page_ids[page_id] = len(pages)
+                pages.append(page)
+        self.pages = pages
+        self.postings = {
+            term: {page_ids[page_id]: tf for page_id, tf in postings.items()}
+            for term, postings in self.postings.items()
+        }
+        for indexed_file in self.indexed_files.values():
+            indexed_file["pages"] = [page_ids[page_id] for page_id in indexed_file["pages"]]
+
+    def _add_file(self, file: str, fingerprint: str):
+        document = self.load_document(file)
+        page_ids = []
+        for page_number in range(document.page_count):
+            terms = tokenize(document.page(page_number))
+            page_id = len(self.pages)
+            self.pages.append((file, page_number, len(terms)))
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, {})[page_id] = tf
+            self._total_length += len(terms)
+            self._live_pages += 1
+            page_ids.append(page_id)
+        self.indexed_files[file] = {"fingerprint": fingerprint, "pages": page_ids}
+
+    def refresh(self) -> bool:
+        """
+        (Re)indexes the files that changed since they were last indexed.
+        Returns True if the index was modified.
+        """
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> bool:
+        self._refreshed_at = time.monotonic()
+        modified = False
+        for file in self.files:
+            if not os.path.exists(file):
+                if file in self.indexed_files:
+                    self._remove_file(file)
+                    modified = True
+                continue
+            fingerprint = file_fingerprint(file)
+            if (
+                file in self.indexed_files
+                and self.indexed_files[file]["fingerprint"] == fingerprint
+            ):
+                continue
+            if file in self.indexed_files:
+                self._remove_file(file)
+            self._add_file(file, fingerprint)
+            modified = True
+        if modified:
+            if self._live_pages < len(self.pages):
+                self._compact()
+            self.save()
+        return modified
+
+    def _snippet(self, file: str, page_number: int, terms: set[str], width: int = 120) -> str:
+        text = self.load_document(file).page(page_number)
+        position = 0
+        for match in TOKEN_PATTERN.finditer(text.lower()):
+            if match.group() in terms:
+                position = match.start()
+                break
+        start = max(0, position - width // 2)
+        snippet = " ".join(text[start : start + width].split())
+        return f"...{snippet}..." if start > 0 else f"{snippet}..."
+
+    def search(self, query: str, top_k: int = 5) -> list[SearchHit]:
+        with self._lock:
+            return self._search(query, top_k)
+
+    def _search(self, query: str, top_k: int) -> list[SearchHit]:
+        if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            self.refresh()
+        top_k = max(1, top_k)
+        if not self._live_pages:
+            return []
+        query_terms = set(tokenize(query))
+        average_length = self._total_length / self._live_pages
+
+        scores: dict[int, float] = {}
+        for term in query_terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (self._live_pages - len(postings) + 0.5) / (len(postings) + 0.5))
+            for page_id, tf in postings.items():
+                length = self.pages[page_id][2]
+                normalization = self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[page_id] = scores.get(page_id, 0.0) + idf * tf * (self.k1 + 1) / (
+                    tf + normalization
+                )
+
+        hits: list[SearchHit] = []
+        for page_id, score in sorted(scores.items(), key=lambda item: -item[1])[:top_k]:
+            file, page_number, _ = self.pages[page_id]
+            hits.append(
+                {
+                    "file": file,
+                    "page": page_number,
+                    "score": score,
+                    "snippet": self._snippet(file, page_number, query_terms),
+                }
+            )
+        return hits
@@ -0,0 +1,221 @@
+import abc
+import asyncio
+import json
+import math
+import random
+import re
+
+from abc import ABC
+from typing import Any, Optional, TypedDict
+
+from aes_agent.compaction import estimate_tokens
+from aes_agent.llm import AnthropicLLM, FirstTokenCallback, LLMResponse, OpenAILLM, OutputCallback
+
+TURN_MARKER = re.compile(r"<Tool execution \(turn (\d+)\)>")
+
+
+class LatencyDistribution:
+    """Log-normal latency (in seconds) around a median, `sigma` = 0 makes it constant"""
+
+    def __init__(self, median: float, sigma: float = 0.0, maximum: Optional[float] = None):
+        self.median = median
+        self.sigma = sigma
+        self.maximum = maximum
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        latency = self.median * math.exp(random.gauss(0, self.sigma)) if self.sigma else self.median
+        return min(latency, self.maximum) if self.maximum is not None else latency
+
+
+class ScriptedCall(TypedDict):
+    name: str
+    arguments: dict
+
+
+# Tool calls of each turn, the last turn should call final_answer
+ToolScript = list[list[ScriptedCall]]
+
+
+def default_script(turns: int = 5, calls_per_turn: int = 1) -> ToolScript:
+    """Fetches documents from the latency server for `turns` - 1 turns, then answers"""
+    script: ToolScript = [
+        [
+            {"name": "fetch_document", "arguments": {"document_id": f"doc-{turn}-{call}"}}
+            for call in range(calls_per_turn)
+        ]
+        for turn in range(turns - 1)
+    ]
+    return [*script, [{"name": "final_answer", "arguments": {"answer": "done"}}]]
+
+
+def current_turn(messages: list[dict]) -> int:
+    """Index of the turn a prompt was built for, from the turns rendered in its history"""
+    turn = 0
+    for message in messages:
+        if message["role"] != "assistant":
+            continue
+        content = message["content"]
+        match = TURN_MARKER.search(content) if isinstance(content, str) else None
+        # Text renderings send a message per tool call, tagged with their turn
+        turn = max(turn, int(match.group(1))) if match else turn + 1
+    return turn
+
+
+class SimulatedLLM(ABC):
+    """
+    Stand-in for an LLM provider, following a script of tool calls.
+
+    Tool calls are emitted as the native format of the backend (tool_use blocks,
+    function_call items) or, in "custom-parser" mode, as the text action the
+    custom parser expects (only the first call of a turn, the format has one).
+    Responses are SDK objects, after a sampled latency (time to first token
+    plus generation time when streaming). The same instance can serve any
+    number of concurrent agents: the turn is read from the prompt.
+    """
+
+    def __init__(
+        self,
+        script: Optional[ToolScript] = None,
+        mode: str = "native",
+        latency: Optional[LatencyDistribution] = None,
+        time_to_first_token: Optional[LatencyDistribution] = None,
+        output_tokens: int = 50,
+    ):
+        self.script = script if script is not None else default_script()
+        self.mode = mode
+        self.latency = latency or LatencyDistribution(1.0, 0.3)
+        self.time_to_first_token = time_to_first_token or LatencyDistribution(0.3, 0.3)
+        self.output_tokens = output_tokens
+
+    def _calls(self, messages: list[dict]) -> list[ScriptedCall]:
+        return self.script[min(current_turn(messages), len(self.script) - 1)]
+
+    def _action(self, call: ScriptedCall) -> str:
+        arguments = ", ".join(f"{name}={value!r}" for name, value in call["arguments"].items())
+        return f"Reasoning: following the script\nAction: {call['name']}({arguments})"
+
+    def _input_tokens(self, messages: list[dict], available_tools: list, context: str) -> int:
+        return estimate_tokens(json.dumps([messages, available_tools, context], default=str))
+
+    @abc.abstractmethod
+    def _response(self, messages: list[dict], available_tools: list, context: str) -> LLMResponse:
+        """Scripted response of the backend's SDK type"""
+        pass
+
+    async def query(
+        self, messages: list[dict], available_tools: list = [], context: str = ""
+    ) -> LLMResponse:
+        await asyncio.sleep(self.latency.sample())
+        return self._response(messages, available_tools, context)
+
+    async def stream(
+        self,
+        messages: list[dict],
+        available_tools: list,
+        on_output: OutputCallback,
+        context: str = "",
+        on_first_token: Optional[FirstTokenCallback] = None,
+    ) -> LLMResponse:
+        time_to_first_token = self.time_to_first_token.sample()
+        await asyncio.sleep(time_to_first_token)
+        if on_first_token is not None:
+            on_first_token()
+        await asyncio.sleep(max(0.0, self.latency.sample() - time_to_first_token))
+        response = self._response(messages, available_tools, context)
+        for output in self.output_items(response):
+            on_output(output)
+        return response
+
+
+class SimulatedAnthropicLLM(SimulatedLLM, AnthropicLLM):
+    def __init__(self, model: str = "simulated", streaming: bool = True, **kwargs: Any):
+        AnthropicLLM.__init__(self, model, streaming=streaming)
+        SimulatedLLM.__init__(self, **kwargs)
+
+    def _response(self, messages: list[dict], available_tools: list, context: str) -> LLMResponse:
+        from anthropic.types import Message
+
+        calls = self._calls(messages)
+        if self.mode == "custom-parser":
+            content = [{"type": "text", "text": self._action(calls[0])}]
+        else:
+            turn = current_turn(messages)
+            content = [{"type": "text", "text": "Following the script"}] + [
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_{turn}_{i}",
+                    "name": call["name"],
+                    "input": call["arguments"],
+                }
+                for i, call in enumerate(calls)
+            ]
+        return Message.model_validate(
+            {
+                "id": "msg_simulated",
+                "type": "message",
+                "role": "assistant",
+                "model": self.model,
+                "content": content,
+                "stop_reason": "tool_use" if self.mode != "custom-parser" else "end_turn",
+                "usage": {
+                    "input_tokens": self._input_tokens(messages, available_tools, context),
+                    "output_tokens": self.output_tokens,
+                },
+            }
+        )
+
+
+class SimulatedOpenAILLM(SimulatedLLM, OpenAILLM):
+    def __init__(self, model: str = "simulated", streaming: bool = True, **kwargs: Any):
+        OpenAILLM.__init__(self, model, streaming=streaming)
+        SimulatedLLM.__init__(self, **kwargs)
+
+    def _response(self, messages: list[dict], available_tools: list, context: str) -> LLMResponse:
+        from openai.types.responses import Response
+
+        calls = self._calls(messages)
+        text = self._action(calls[0]) if self.mode == "custom-parser" else "Following the script"
+        output: list[dict] = [
+            {
+                "type": "message",
+                "id": "msg_simulated",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ]
+        if self.mode != "custom-parser":
+            turn = current_turn(messages)
+            output += [
+                {
+                    "type": "function_call",
+                    "id": f"fc_{turn}_{i}",
+                    "call_id": f"call_{turn}_{i}",
+                    "name": call["name"],
+                    "arguments": json.dumps(call["arguments"]),
+                    "status": "completed",
+                }
+                for i, call in enumerate(calls)
+            ]
+        input_tokens = self._input_tokens(messages, available_tools, context)
+        return Response.model_validate(
+            {
+                "id": "resp_simulated",
+                "object": "response",
+                "created_at": 0,
+                "model": self.model,
+                "output": output,
+                "parallel_tool_calls": True,
+                "tool_choice": "auto",
+                "tools": [],
+                "usage": {
+                    "input_tokens": input_tokens,
+                    "output_tokens": self.output_tokens,
+                    "total_tokens": input_tokens + self.output_tokens,
+                    "input_tokens_details": {"cached_tokens": 0},
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                },
+            }
+        )
@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+import weakref
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Tracer of the current run, inherited by the tasks it spawns (None when tracing is off)
+_current_tracer: ContextVar[Optional["Tracer"]] = ContextVar("aes_agent_tracer", default=None)
+
+
+class Tracer:
+    """
+    Collects nested spans and saves them in the Chrome trace event format, which
+    opens in chrome://tracing, Perfetto (ui.perfetto.dev) or Speedscope.
+
+    Each asyncio task gets its own track, so that spans of concurrent agents
+    and of concurrent tool calls don't overlap. Spans of a track nest by time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.events: list[dict] = []
+        self._start = time.perf_counter_ns()
+        self._pid = os.getpid()
+        self._tracks: "weakref.WeakKeyDictionary[asyncio.Task, int]" = weakref.WeakKeyDictionary()
+        self._track_ids = itertools.count(1)
+
+    def _now(self) -> float:
+        """Microseconds since the tracer was created"""
+        return (time.perf_counter_ns() - self._start) / 1000
+
+    def _track(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 0
+        if task not in self._tracks:
+            self._tracks[task] = next(self._track_ids)
+            self.events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self._pid,
+                    "tid": self._tracks[task],
+                    "args": {"name": task.get_name()},
+                }
+            )
+        return self._tracks[task]
+
+    @contextmanager
+    def span(self, name: str, **args) -> Iterator[dict]:
+        """Records the enclosed block as a span, `args` (extended by the block if needed) are attached to it"""
+        track = self._track()
+        start = self._now()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = repr(e)
+            raise
+        finally:
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": "aes_agent",
+                    "ph": "X",
+                    "ts": start,
+                    "dur": self._now() - start,
+                    "pid": self._pid,
+                    "tid": track,
+                    "args": args,
+                }
+            )
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.{os.getpid()}.tmp", "w") as trace_file:
+            json.dump(
+                {"traceEvents": self.events, "displayTimeUnit": "ms"}, trace_file, default=str
+            )
+        os.replace(f"{self.path}.{os.getpid()}.tmp", self.path)
+
+
+@contextmanager
+def use_tracer(tracer: Optional[Tracer]) -> Iterator[None]:
+    """Makes `tracer` record the spans of the current task and of the tasks it creates"""
+    token = _current_tracer.set(tracer)
+    try:
+        yield
+    finally:
+        _current_tracer.reset(token)
+
+
+@contextmanager
+def span(name: str, **args) -> Iterator[dict]:
+    """Span of the current tracer, does nothing when tracing is off"""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield args
+        return
+    with tracer.span(name, **args) as span_args:
+        yield span_args
@@ -1,7 +1,10 @@
 import ast
+import hashlib
+import json
+import os
 import sys
 
-from typing import TypedDict, Any, Optional
+from typing import TypedDict, Any, NotRequired, Optional
 
 class ToolCallingResults(TypedDict):
     name: str
@@ -13,6 +16,28 @@ class ToolCallingResults(TypedDict):
 class Turn(TypedDict):
     reasoning: str
     tools_called: list[ToolCallingResults]
+    usage: NotRequired[dict]
+    compaction: NotRequired[dict]
+    metrics: NotRequired[dict]
+
+def cache_dir() -> str:
+    """Directory where aes-agent persists its caches, overridable with AES_AGENT_CACHE_DIR"""
+    return os.environ.get(
+        "AES_AGENT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "aes_agent")
+    )
+
+def to_jsonable(value: Any) -> Any:
+    """`default` for json.dumps: SDK objects (pydantic models) kept in turns' metadata are dumped"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+def canonical_hash(value: Any) -> str:
+    """Hash of a JSON-like value (e.g. a request) that doesn't depend on the order of its keys"""
+    canonical_json = json.dumps(
+        value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=to_jsonable
+    )
+    return hashlib.sha256(canonical_json.encode()).hexdigest()
 
 def format_args(args: dict):
     arguments_list_formated = []
@@ -0,0 +1,132 @@
+"""
+Extracts PDFs into the page store ahead of the first read, in parallel across cores.
+
+A standalone local search server runs it on its available files before it
+starts. It can also be run ahead of time over a directory:
+
+    aes-agent-warmup example_resources/ --workers 8
+"""
+
+import glob
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Optional, TypedDict
+
+from loguru import logger
+
+from aes_agent.documents import PageStore
+
+# Called after each extracted file with (files done, files to extract, file path)
+ProgressCallback = Callable[[int, int, str], None]
+
+
+class WarmupStats(TypedDict):
+    files: int
+    extracted: int
+    already_stored: int
+    failed: list[str]
+    pages: int
+    seconds: float
+
+
+def _extract(file_path: str, store_root: str) -> int:
+    """Runs in a worker process: extracts a file into the store, returns its number of pages"""
+    document = PageStore(store_root).get(file_path)
+    page_count = document.page_count
+    document.close()
+    return page_count
+
+
+def log_progress(done: int, total: int, file_path: str):
+    logger.info(f"Extracted {done}/{total} files ({file_path})")
+
+
+def warm_up(
+    file_paths: list[str],
+    page_store: Optional[PageStore] = None,
+    max_workers: Optional[int] = None,
+    progress: Optional[ProgressCallback] = log_progress,
+) -> WarmupStats:
+    """
+    Extracts the files that aren't in the page store yet, with a pool of `max_workers`
+    processes (one per core by default, in this process if there's a single file to extract).
+    """
+    start = time.perf_counter()
+    page_store = page_store or PageStore()
+    file_paths = list(dict.fromkeys(file_path for file_path in file_paths if os.path.isfile(file_path)))
+    missing = [file_path for file_path in file_paths if page_store.lookup(file_path) is None]
+    stats: WarmupStats = {
+        "files": len(file_paths),
+        "extracted": 0,
+        "already_stored": len(file_paths) - len(missing),
+        "failed": [],
+        "pages": 0,
+        "seconds": 0.0,
+    }
+    workers = min(len(missing), max_workers or os.cpu_count() or 1)
+
+    def done(file_path: str, page_count: Optional[int]):
+        if page_count is None:
+            stats["failed"].append(file_path)
+        else:
+            stats["extracted"] += 1
+            stats["pages"] += page_count
+        if progress is not None:
+            progress(stats["extracted"] + len(stats["failed"]), len(missing), file_path)
+
+    if workers <= 1:
+        for file_path in missing:
+            try:
+                page_count = page_store.get(file_path).page_count
+            except Exception as e:
+                logger.warning(f"Couldn't extract {file_path}: {e!r}")
+                page_count = None
+            done(file_path, page_count)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_extract, file_path, page_store.root): file_path
+                for file_path in missing
+            }
+            for future in as_completed(futures):
+                try:
+                    page_count = future.result()
+                except Exception as e:
+                    logger.warning(f"Couldn't extract {futures[future]}: {e!r}")
+                    page_count = None
+                done(futures[future], page_count)
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def main():
+    parser = ArgumentParser(description="Extracts the PDFs of directories into the page store")
+    parser.add_argument("paths", nargs="+", help="Directories (searched recursively) or PDF files")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--store", type=str, default=None, help="Page store directory (default: the cache's)")
+    args = parser.parse_args()
+
+    file_paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            file_paths += sorted(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True))
+        else:
+            file_paths.append(path)
+
+    stats = warm_up(file_paths, PageStore(args.store), args.workers)
+    logger.success(
+        f"Extracted {stats['extracted']} files ({stats['pages']} pages) in {stats['seconds']:.1f}s, "
+        f"{stats['already_stored']} were already stored"
+    )
+    if stats["failed"]:
+        logger.error(f"Failed to extract: {', '.join(stats['failed'])}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()